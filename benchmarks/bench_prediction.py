@@ -0,0 +1,270 @@
+"""Reproducible latency/throughput benchmarks for the prediction path.
+
+Measures, on fixed synthetic inputs drawn from the app's widget ranges:
+
+* cold model load (fresh interpreter, per load path) and its peak RSS
+* single-row predict_proba p50/p99 per backend
+* predict_batch throughput at 1 / 10 / 100 / 10k rows per backend
+* Streamlit script rerun time for the app, via streamlit's AppTest harness
+* chart build + serialization time and payload size, rebuilt vs cached
+* peak RSS of the benchmark process
+
+Results are written as JSON. ``--compare`` checks a run against a saved
+baseline and exits non-zero when a metric regressed by more than
+``--threshold``.
+
+Usage::
+
+    python benchmarks/bench_prediction.py --output bench.json
+    python benchmarks/bench_prediction.py --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np  # noqa: E402
+
+from heart_risk.coldstart import measure  # noqa: E402
+from heart_risk.engine import BACKENDS, HeartRiskPredictor, reference_inputs  # noqa: E402
+
+APP_PATH = os.path.join(REPO_ROOT, 'heart_disease_app.py')
+BATCH_SIZES = (1, 10, 100, 10_000)
+SINGLE_ROW_CALLS = 1000
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024
+    except (OSError, StopIteration):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def metric(value, unit, better='lower'):
+    return {'value': round(float(value), 6), 'unit': unit, 'better': better}
+
+
+def bench_cold_load(repeat):
+    results = {}
+    variants = [(backend, False) for backend in BACKENDS]
+    if os.path.isdir(os.path.join(REPO_ROOT, 'model_bundle')):
+        variants.append(('flat', True))
+    for backend, prefer_bundle in variants:
+        seconds, peak_kb = measure(
+            f"from heart_risk import HeartRiskPredictor\n"
+            f"HeartRiskPredictor.load(backend={backend!r}, prefer_bundle={prefer_bundle!r})",
+            repeat, cwd=REPO_ROOT
+        )
+        name = f"{'bundle' if prefer_bundle else 'pickles'}.{backend}"
+        results[f'cold_load.{name}.ms'] = metric(seconds * 1000, 'ms')
+        results[f'cold_load.{name}.peak_rss_mb'] = metric(peak_kb / 1024, 'MB')
+    return results
+
+
+def bench_single_row(predictor, rows):
+    for row in rows[:50]:  # Warm up
+        predictor.predict_proba(row)
+    timings = np.empty(SINGLE_ROW_CALLS)
+    for i in range(SINGLE_ROW_CALLS):
+        row = rows[i % len(rows)]
+        started = time.perf_counter()
+        predictor.predict_proba(row)
+        timings[i] = time.perf_counter() - started
+    return {
+        f'single_row.{predictor.backend}.p50_us': metric(np.percentile(timings, 50) * 1e6, 'us'),
+        f'single_row.{predictor.backend}.p99_us': metric(np.percentile(timings, 99) * 1e6, 'us'),
+    }
+
+
+def bench_batches(predictor, inputs, rounds=5, round_seconds=0.1):
+    # Best of several short rounds, to damp scheduler noise on shared hosts
+    results = {}
+    for size in BATCH_SIZES:
+        batch = inputs[:size]
+        predictor.predict_batch(batch)
+        best = 0.0
+        for _ in range(rounds):
+            calls, started = 0, time.perf_counter()
+            while True:
+                predictor.predict_batch(batch)
+                calls += 1
+                elapsed = time.perf_counter() - started
+                if elapsed >= round_seconds:
+                    break
+            best = max(best, calls * size / elapsed)
+        results[f'batch.{predictor.backend}.{size}.rows_per_s'] = metric(
+            best, 'rows/s', better='higher'
+        )
+    return results
+
+
+def bench_streamlit_rerun(reruns):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {}
+    import logging
+
+    logging.disable(logging.WARNING)
+    sys.path.insert(0, REPO_ROOT)
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    started = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(f"App raised during benchmark: {app.exception[0].message}")
+
+    timings = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+    predict_timings = []
+    for _ in range(max(1, reruns // 2)):
+        app.button[0].click()
+        started = time.perf_counter()
+        app.run()
+        predict_timings.append(time.perf_counter() - started)
+    logging.disable(logging.NOTSET)
+    return {
+        'streamlit.first_run.ms': metric(first * 1000, 'ms'),
+        'streamlit.rerun.p50_ms': metric(statistics.median(timings) * 1000, 'ms'),
+        'streamlit.predict_rerun.p50_ms': metric(statistics.median(predict_timings) * 1000, 'ms'),
+    }
+
+
+def bench_charts(predictor, rows, repeat=200):
+    try:
+        import plotly  # noqa: F401
+    except ImportError:
+        return {}
+    from heart_risk.charts import (FigureTemplate, build_importance_figure, build_risk_gauge,
+                                   serialize)
+
+    values = [float(p) * 100 for p in predictor.predict_proba(rows)[:, 1]]
+    template = FigureTemplate(build_risk_gauge(0))
+    importances = tuple(predictor.feature_importances_)
+    importance = build_importance_figure(importances)
+
+    def median_ms(make, repeat=repeat):
+        timings = []
+        for index in range(repeat):
+            started = time.perf_counter()
+            serialize(make(values[index % len(values)]))
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000
+
+    # The gauge as built before templating: plotly's default template
+    default = build_risk_gauge(values[0])
+    default.update_layout(template='plotly')
+    return {
+        'charts.gauge.rebuilt_ms': metric(median_ms(build_risk_gauge), 'ms'),
+        'charts.gauge.patched_ms': metric(median_ms(lambda v: template.patch(value=v)), 'ms'),
+        'charts.gauge.default_template_bytes': metric(len(serialize(default)), 'bytes'),
+        'charts.gauge.bytes': metric(len(serialize(template.patch(value=values[0]))), 'bytes'),
+        'charts.importance.rebuilt_ms': metric(
+            median_ms(lambda v: build_importance_figure(importances), repeat=repeat // 10), 'ms'
+        ),
+        'charts.importance.cached_ms': metric(median_ms(lambda v: importance), 'ms'),
+        'charts.importance.bytes': metric(len(serialize(importance)), 'bytes'),
+    }
+
+
+def run(args):
+    inputs = reference_inputs(max(BATCH_SIZES), seed=args.seed)
+    metrics = {}
+    if not args.skip_cold:
+        metrics.update(bench_cold_load(args.repeat))
+    for backend in BACKENDS:
+        predictor = HeartRiskPredictor.load(backend=backend, prefer_bundle=False, cache=False)
+        metrics.update(bench_single_row(predictor, inputs[:256]))
+        metrics.update(bench_batches(predictor, inputs))
+    metrics.update(bench_charts(predictor, inputs[:256]))
+    if not args.skip_streamlit:
+        metrics.update(bench_streamlit_rerun(args.reruns))
+    metrics['process.peak_rss_mb'] = metric(peak_rss_mb(), 'MB')
+
+    import sklearn
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed
+        },
+        'metrics': metrics
+    }
+
+
+def compare(current, baseline, threshold):
+    """Return ``(rows, regressions)`` comparing metric values to a baseline."""
+    rows, regressions = [], []
+    for name, entry in sorted(current['metrics'].items()):
+        base = baseline['metrics'].get(name)
+        if base is None or not base['value']:
+            continue
+        change = (entry['value'] - base['value']) / base['value']
+        worse = change > threshold if entry['better'] == 'lower' else change < -threshold
+        rows.append((name, base['value'], entry['value'], change, worse))
+        if worse:
+            regressions.append(name)
+    return rows, regressions
+
+
+def report(results, baseline_path=None, threshold=0.10):
+    """Print ``results``' metrics, or their change against the baseline file
+    at ``baseline_path``. Returns the exit code: 1 if anything regressed."""
+    if not baseline_path:
+        for name, entry in sorted(results['metrics'].items()):
+            print(f"{name:<45} {entry['value']:>14,.2f} {entry['unit']}")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    rows, regressions = compare(results, baseline, threshold)
+    for name, before, after, change, worse in rows:
+        flag = '  REGRESSION' if worse else ''
+        print(f"{name:<45} {before:>14,.2f} -> {after:>14,.2f} ({change:+.1%}){flag}")
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {threshold:.0%}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Flag regressions against a saved results file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change that counts as a regression (default 0.10)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3, help='Cold-load repetitions')
+    parser.add_argument('--reruns', type=int, default=20, help='Streamlit reruns')
+    parser.add_argument('--skip-cold', action='store_true')
+    parser.add_argument('--skip-streamlit', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return report(results, args.compare, args.threshold)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""Load test of the prediction path with many concurrent virtual users.
+
+Each virtual user loops until ``--duration`` elapses. It waits a think
+time, drawn from an exponential distribution with mean ``--think``
+seconds (0 sends the next request as soon as the last one returns).
+Then it asks for a prediction on a fresh random profile. Two targets:
+
+* ``engine``: in-process, every user is a thread calling
+  ``predictor.predict_one`` and, with ``--charts``, building the gauge
+  figure the app sends for that prediction. This isolates the engine's
+  contention (GIL, cache lock, metrics) from Streamlit.
+* ``server``: a running Streamlit server, driven the way a browser
+  drives it. Every user opens the app's websocket, renders the page,
+  moves the sliders and clicks Predict Risk, timing each rerun until the
+  server reports the script finished. After ``--predictions-per-session``
+  predictions the user disconnects and reconnects as a new session, so
+  long runs show how memory grows with the number of sessions served.
+  Without ``--url`` the app is started on a free local port and stopped
+  afterwards.
+
+The report gives throughput, latency percentiles, errors and the RSS of
+the serving process, sampled every ``--sample-interval`` seconds. It
+includes RSS growth per session and per minute, measured after the
+first ``--warmup`` seconds. A leak of
+``st.session_state`` or of figure objects shows up as growth that keeps
+rising with sessions served instead of levelling off. Streamlit keeps a
+disconnected session for ``server.disconnectedSessionTTL`` (120 s by
+default), so memory is only released that long after users leave; run
+for longer than that before reading a trend.
+
+Usage::
+
+    python benchmarks/load_test.py engine --users 50 --duration 60 --think 0.5
+    python benchmarks/load_test.py server --users 20 --duration 300 --think 2
+    python benchmarks/load_test.py server --url http://localhost:8501 --pid 1234
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np  # noqa: E402
+
+from bench_prediction import APP_PATH, metric, report  # noqa: E402
+from heart_risk.engine import reference_inputs  # noqa: E402
+
+# Integer sliders of the app and their ranges; the selectboxes keep their defaults
+APP_SLIDERS = {
+    'Age (years)': (20, 100),
+    'Resting Blood Pressure (mmHg)': (80, 200),
+    'Serum Cholesterol (mg/dl)': (100, 400),
+    'Maximum Heart Rate Achieved': (60, 220),
+}
+PREDICT_LABEL = 'Predict Risk'
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:')) / 1024
+    except (OSError, StopIteration):
+        return None
+
+
+class LoadStats:
+    """Latencies, errors and session count shared by all virtual users."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.sessions = 0
+        self.error_messages = {}
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def fail(self, message):
+        with self._lock:
+            self.errors += 1
+            self.error_messages[message] = self.error_messages.get(message, 0) + 1
+
+    def session_started(self):
+        with self._lock:
+            self.sessions += 1
+
+
+class MemorySampler(threading.Thread):
+    """Samples the RSS of ``pid`` with the number of sessions served so far."""
+
+    def __init__(self, pid, stats, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.stats = stats
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def sample(self):
+        rss = rss_mb(self.pid)
+        if rss is not None:
+            self.samples.append((time.perf_counter(), self.stats.sessions, rss))
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+
+
+def think(rng, mean):
+    return rng.expovariate(1 / mean) if mean > 0 else 0
+
+
+def run_engine(args, stats):
+    """Run the virtual users as threads against an in-process predictor."""
+    from heart_risk.engine import HeartRiskPredictor
+
+    predictor = HeartRiskPredictor.load(backend=args.backend,
+                                        cache=None if args.cache else False)
+    gauge = None
+    if args.charts:
+        from heart_risk.charts import FigureTemplate, build_risk_gauge, serialize
+
+        gauge = FigureTemplate(build_risk_gauge(0))
+    deadline = time.perf_counter() + args.duration
+
+    def user(index):
+        rng = random.Random(args.seed + index)
+        profiles = reference_inputs(256, seed=args.seed + index)
+        stats.session_started()
+        while True:
+            time.sleep(think(rng, args.think))
+            if time.perf_counter() >= deadline:
+                return
+            profile = tuple(profiles[rng.randrange(len(profiles))])
+            started = time.perf_counter()
+            try:
+                result = predictor.predict_one(profile)
+                if gauge is not None:
+                    serialize(gauge.patch(value=result.probability * 100))
+            except Exception as e:
+                stats.fail(type(e).__name__)
+                continue
+            stats.record(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=user, args=(index,), daemon=True)
+               for index in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class AppSession:
+    """One browser tab: a Streamlit websocket session on the app."""
+
+    def __init__(self, url):
+        self.url = url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+        self.connection = None
+        self.page_script_hash = ''
+        self.widgets = {}
+
+    async def open(self):
+        from tornado.websocket import websocket_connect
+
+        self.connection = await websocket_connect(self.url, subprotocols=['streamlit'])
+        return await self.rerun([])
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    async def rerun(self, widget_states):
+        """Rerun the script with ``widget_states``; returns any exception
+        messages the script showed."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = self.page_script_hash
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+
+        exceptions = []
+        while True:
+            payload = await self.connection.read_message()
+            if payload is None:
+                raise ConnectionError("Server closed the websocket")
+            forward = ForwardMsg()
+            forward.ParseFromString(payload)
+            kind = forward.WhichOneof('type')
+            if kind == 'new_session':
+                self.page_script_hash = forward.new_session.page_script_hash
+            elif kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                widget = element.WhichOneof('type')
+                if widget in ('slider', 'button'):
+                    self.widgets[getattr(element, widget).label] = getattr(element, widget).id
+                elif widget == 'exception':
+                    exceptions.append(element.exception.message)
+            elif kind == 'script_finished':
+                if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return exceptions
+
+    def predict_states(self, rng):
+        """Widget states for a click on Predict Risk with random slider values."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        states = []
+        for label, (low, high) in APP_SLIDERS.items():
+            if label in self.widgets:
+                state = WidgetState(id=self.widgets[label])
+                state.double_array_value.data.append(rng.randint(low, high))
+                states.append(state)
+        button = next(widget_id for label, widget_id in self.widgets.items()
+                      if PREDICT_LABEL in label)
+        states.append(WidgetState(id=button, trigger_value=True))
+        return states
+
+
+async def _server_user(index, args, stats, deadline):
+    rng = random.Random(args.seed + index)
+    session = None
+    served = 0
+    while time.perf_counter() < deadline:
+        try:
+            if session is None or served >= args.predictions_per_session:
+                if session is not None:
+                    session.close()
+                session = AppSession(args.url)
+                await session.open()
+                stats.session_started()
+                served = 0
+            await asyncio.sleep(think(rng, args.think))
+            if time.perf_counter() >= deadline:
+                break
+            started = time.perf_counter()
+            exceptions = await session.rerun(session.predict_states(rng))
+            served += 1
+            if exceptions:
+                stats.fail(exceptions[0].splitlines()[0][:80])
+            else:
+                stats.record(time.perf_counter() - started)
+        except Exception as e:
+            stats.fail(type(e).__name__)
+            if session is not None:
+                session.close()
+            session = None
+            await asyncio.sleep(1)
+    if session is not None:
+        session.close()
+
+
+def run_server(args, stats):
+    """Run the virtual users as coroutines on one event loop, so the client
+    side stays cheap next to the server it measures."""
+    async def main():
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(_server_user(index, args, stats, deadline)
+                               for index in range(args.users)))
+
+    asyncio.run(main())
+
+
+def start_app(port):
+    """Start the app headless on ``port``; returns the process once healthy."""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.headless', 'true',
+         '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    health = f'http://localhost:{port}/_stcore/health'
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError(f"Streamlit exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(health, timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Streamlit did not become healthy within 30 s")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def summarize(args, stats, samples, elapsed):
+    latencies = np.array(stats.latencies) * 1000
+    results = {
+        f'load.{args.target}.requests': metric(len(latencies), 'count', better='higher'),
+        f'load.{args.target}.errors': metric(stats.errors, 'count'),
+        f'load.{args.target}.throughput_rps': metric(len(latencies) / elapsed, 'req/s',
+                                                     better='higher'),
+        f'load.{args.target}.sessions': metric(stats.sessions, 'count', better='higher'),
+    }
+    if len(latencies):
+        for p in (50, 90, 99):
+            results[f'load.{args.target}.p{p}_ms'] = metric(np.percentile(latencies, p), 'ms')
+        results[f'load.{args.target}.max_ms'] = metric(latencies.max(), 'ms')
+    # Growth is read after the warm-up, once the model and app modules are loaded
+    steady = [sample for sample in samples if sample[0] - samples[0][0] >= args.warmup]
+    if len(steady) >= 2:
+        times, sessions, rss = (np.array(column, dtype=float) for column in zip(*steady))
+        results[f'load.{args.target}.rss_start_mb'] = metric(rss[0], 'MB')
+        results[f'load.{args.target}.rss_peak_mb'] = metric(rss.max(), 'MB')
+        results[f'load.{args.target}.rss_end_mb'] = metric(rss[-1], 'MB')
+        if sessions[-1] > sessions[0]:
+            results[f'load.{args.target}.rss_per_session_kb'] = metric(
+                (rss[-1] - rss[0]) * 1024 / (sessions[-1] - sessions[0]), 'KB'
+            )
+        # Least-squares slope, less sensitive to GC sawtooth than end - start
+        if times[-1] > times[0]:
+            results[f'load.{args.target}.rss_growth_mb_per_min'] = metric(
+                np.polyfit(times - times[0], rss, 1)[0] * 60, 'MB/min'
+            )
+    return results
+
+
+def run(args):
+    stats = LoadStats()
+    process = None
+    pid = os.getpid()
+    if args.target == 'server':
+        if args.url is None:
+            port = _free_port()
+            process = start_app(port)
+            args.url = f'http://localhost:{port}'
+            pid = process.pid
+        else:
+            pid = args.pid
+    sampler = MemorySampler(pid, stats, args.sample_interval) if pid else None
+    try:
+        if sampler is not None:
+            sampler.sample()
+            sampler.start()
+        started = time.perf_counter()
+        (run_engine if args.target == 'engine' else run_server)(args, stats)
+        elapsed = time.perf_counter() - started
+        if sampler is not None:
+            sampler.stop()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    samples = sampler.samples if sampler is not None else []
+    return {
+        'meta': {
+            'target': args.target,
+            'users': args.users,
+            'think_s': args.think,
+            'duration_s': args.duration,
+            'seed': args.seed,
+            'errors': stats.error_messages,
+        },
+        'metrics': summarize(args, stats, samples, elapsed),
+        'memory': [{'t': round(t - samples[0][0], 2), 'sessions': sessions, 'rss_mb': round(rss, 1)}
+                   for t, sessions, rss in samples],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('target', choices=('engine', 'server'))
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+    parser.add_argument('--think', type=float, default=1.0,
+                        help='Mean think time between requests in seconds (0: none)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sample-interval', type=float, default=1.0,
+                        help='Seconds between RSS samples')
+    parser.add_argument('--warmup', type=float, default=5.0,
+                        help='Seconds excluded from the memory growth figures')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Flag regressions against a saved results file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change that counts as a regression (default 0.10)')
+
+    engine = parser.add_argument_group('engine target')
+    engine.add_argument('--backend', default=None, help='Predictor backend (default: env)')
+    engine.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='Disable the prediction cache')
+    engine.add_argument('--charts', action='store_true',
+                        help='Also build and serialize the gauge per prediction')
+
+    server = parser.add_argument_group('server target')
+    server.add_argument('--url', help='Running app to test (default: start one locally)')
+    server.add_argument('--pid', type=int, help='Server process to sample memory of')
+    server.add_argument('--predictions-per-session', type=int, default=10,
+                        help='Predictions before a user reconnects as a new session')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    for error, count in results['meta']['errors'].items():
+        print(f"error x{count}: {error}", file=sys.stderr)
+    return report(results, args.compare, args.threshold)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
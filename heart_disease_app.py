@@ -1,14 +1,20 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import pickle
-import joblib
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import time
+import uuid
 import warnings
 warnings.filterwarnings('ignore')
 
+from heart_risk import HeartRiskPredictor, ModelFilesNotFoundError, metrics
+from heart_risk.charts import (FEATURE_LABELS, FigureTemplate, build_contribution_figure,
+                               build_importance_figure, build_risk_gauge, build_sweep_figure)
+from heart_risk.engine import MODEL_FILES
+from heart_risk.drift import MIN_SAMPLES, compare, find_reference
+from heart_risk.explain import explain
+from heart_risk.history import open_log
+from heart_risk.reload import ModelWatcher
+from heart_risk.whatif import sweep
+
 # Page config
 st.set_page_config(
     page_title="Heart Disease Risk Predictor",
@@ -23,7 +29,7 @@ st.set_page_config(
 )
 
 # Static Dark Theme CSS
-st.markdown("""
+DARK_THEME_CSS = """
 <style>
     /* Global Theme Variables - Dark Theme */
     :root {
@@ -356,71 +362,106 @@ st.markdown("""
     ::-webkit-scrollbar-thumb:hover {
         background: var(--text-secondary);
     }
-</style>""", unsafe_allow_html=True)
+</style>"""
+st.markdown(DARK_THEME_CSS, unsafe_allow_html=True)
 
 @st.cache_resource
 def load_model():
     import os
-    import joblib
-    
-    # Multiple possible paths for model files
-    possible_dirs = [
-        os.path.dirname(os.path.abspath(__file__)),  # Same directory as script
-        os.getcwd(),  # Current working directory
-        '/opt/render/project/src',  # Render deployment path
-        '.',  # Current directory
-    ]
-    
-    model_files = {
-        'model': 'heart_disease_model_optimized.pkl',
-        'features': 'feature_names.pkl',
-        'info': 'model_info.pkl'
-    }
-    
-    # Try each directory until we find the files
-    for directory in possible_dirs:
-        try:
-            file_paths = {}
-            all_exist = True
-            
-            # Check if all files exist in this directory
-            for key, filename in model_files.items():
-                file_path = os.path.join(directory, filename)
-                if os.path.exists(file_path):
-                    file_paths[key] = file_path
-                else:
-                    all_exist = False
-                    break
-            
-            if all_exist:
-                # Load all model files
-                model = joblib.load(file_paths['model'])
-                feature_names = joblib.load(file_paths['features'])
-                model_info = joblib.load(file_paths['info'])
-                
-                st.success(f"✅ Model loaded successfully from: {directory}")
-                return model, feature_names, model_info
-                
-        except Exception as e:
-            continue  # Try next directory
-    
-    # If we get here, no directory worked
-    st.error("❌ Model files not found in any expected location!")
-    st.error("Searched directories:")
-    for i, directory in enumerate(possible_dirs, 1):
-        st.error(f"{i}. {directory}")
-    st.error("Required files:")
-    for filename in model_files.values():
-        st.error(f"• {filename}")
-    
-    # Show current directory contents for debugging
+
     try:
-        current_files = os.listdir(os.getcwd())
-        st.error(f"Files in current directory: {current_files}")
-    except:
-        pass
-        
-    return None, None, None
+        predictor = HeartRiskPredictor.load()
+    except ModelFilesNotFoundError as e:
+        st.error("❌ Model files not found in any expected location!")
+        st.error("Searched directories:")
+        for i, directory in enumerate(e.search_dirs, 1):
+            st.error(f"{i}. {directory}")
+        st.error("Required files:")
+        for filename in MODEL_FILES.values():
+            st.error(f"• {filename}")
+
+        # Show current directory contents for debugging
+        try:
+            current_files = os.listdir(os.getcwd())
+            st.error(f"Files in current directory: {current_files}")
+        except:
+            pass
+
+        return None
+
+    # Once per process: optional /metrics endpoint and periodic summary line
+    metrics.start_http_exporter()
+    metrics.start_log_reporter()
+
+    st.success(f"✅ Model loaded successfully from: {predictor.source_dir} "
+               f"({predictor.load_seconds * 1000:.0f} ms)")
+    # New model files are picked up in the background (HEART_RISK_RELOAD_INTERVAL)
+    watcher = ModelWatcher(predictor)
+    watcher.start()
+    return watcher
+
+RISK_MESSAGES = {
+    'low': '✅ Low risk detected – maintain healthy lifestyle practices',
+    'medium': '⚠️ Medium risk detected – consider lifestyle changes and medical consultation',
+    'high': '🚨 High risk detected – seek immediate medical consultation'
+}
+
+@st.cache_resource
+def load_drift_reference(_predictor, model_version):
+    # Reference histograms are static per model, so read once per process
+    return find_reference(_predictor)
+
+@st.cache_resource
+def load_prediction_log(feature_names):
+    # Opt-in via HEART_RISK_PREDICTION_LOG; one background writer per process
+    return open_log(list(feature_names))
+
+def read_batch_file(uploaded_file):
+    # Parquet is detected by extension, everything else is parsed as CSV
+    if uploaded_file.name.lower().endswith(('.parquet', '.pq')):
+        return pd.read_parquet(uploaded_file)
+    return pd.read_csv(uploaded_file)
+
+@st.cache_resource
+def risk_gauge_template():
+    # Themed and validated once per process; predictions only patch the value
+    return FigureTemplate(build_risk_gauge(0))
+
+@st.cache_resource
+def importance_figure(importances):
+    # Static for a given model, so built once per process instead of per rerun
+    return build_importance_figure(importances)
+
+@st.cache_data(max_entries=64)
+def run_sweep(_predictor, model_version, profile, features):
+    # The predictor is not hashed; model_version keys the cache instead
+    return sweep(_predictor, profile, features)
+
+FEATURE_DESCRIPTIONS = {
+    "Age": "Patient age in years. Higher age generally increases cardiovascular risk.",
+    "Sex": "Biological sex (Male/Female). Males typically have higher risk at younger ages.",
+    "Chest Pain Type": "Type of chest pain: Typical angina, Atypical angina, Non-anginal pain, or Asymptomatic.",
+    "Resting Blood Pressure": "Blood pressure when at rest, measured in mmHg. Normal range: 90-140 mmHg.",
+    "Cholesterol": "Serum cholesterol level in mg/dl. Normal: <200 mg/dl, High: >240 mg/dl.",
+    "Fasting Blood Sugar": "Blood sugar level after fasting. >120 mg/dl indicates potential diabetes.",
+    "Resting ECG": "Electrocardiogram results at rest showing heart's electrical activity.",
+    "Maximum Heart Rate": "Highest heart rate achieved during exercise testing.",
+    "Exercise Induced Angina": "Whether chest pain occurs during physical exercise.",
+    "ST Depression": "Depression in ST segment during exercise, indicating potential ischemia.",
+    "ST Slope": "Slope of peak exercise ST segment (Upsloping/Flat/Downsloping).",
+    "Major Vessels": "Number of major blood vessels (0-3) visible in fluoroscopy.",
+    "Thalassemia": "Blood disorder affecting hemoglobin production and heart function."
+}
+
+@st.cache_data
+def feature_cards_html():
+    # One pre-rendered markdown block instead of one element per feature
+    return "".join(f"""
+    <div class="feature-card">
+        <div class="feature-title">{feature}</div>
+        <div class="feature-description">{description}</div>
+    </div>
+    """ for feature, description in FEATURE_DESCRIPTIONS.items())
 
 def main():
     # Header Section
@@ -432,10 +473,15 @@ def main():
     """, unsafe_allow_html=True)
 
     # Load model
-    model, feature_names, model_info = load_model()
-    if model is None:
+    watcher = load_model()
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = uuid.uuid4().hex
+    if watcher is None:
         st.error("⚠️ Unable to load the prediction model. Please check the model files.")
         st.stop()
+    # One model version for the whole rerun, even if a reload lands meanwhile
+    predictor = watcher.current
+    feature_names, model_info = predictor.feature_names, predictor.model_info
 
     # Input Section Card
     st.markdown('<div class="dark-card">', unsafe_allow_html=True)
@@ -535,31 +581,29 @@ def main():
         summary_df = pd.DataFrame(summary_data)
         st.dataframe(summary_df, use_container_width=True)
 
+    profile = (age, sex, cp, trestbps, chol, fbs, restecg,
+               thalach, exang, oldpeak, slope, ca, thal)
+
     # Prediction Button
     st.markdown('<div class="predict-button">', unsafe_allow_html=True)
     if st.button("🔍 Predict Risk", type="primary"):
-        # Create feature array
-        features = np.array([[age, sex, cp, trestbps, chol, fbs, restecg,
-                            thalach, exang, oldpeak, slope, ca, thal]])
-
         # Make prediction
-        prediction = model.predict(features)[0]
-        probability = model.predict_proba(features)[0]
-        risk_prob = probability[1] * 100
+        started = time.perf_counter()
+        result = predictor.predict_one(profile)
+        latency_ms = (time.perf_counter() - started) * 1000
+        prediction_log = load_prediction_log(tuple(feature_names))
+        if prediction_log is not None:
+            prediction_log.record(profile, result, model_hash=predictor.model_hash,
+                                  latency_ms=latency_ms,
+                                  session_id=st.session_state['session_id'])
+        risk_prob = result.risk_prob
 
         # Display prediction result
         risk_percentage_text = f"Risk: {risk_prob:.1f}%"
         
         # Determine risk level and styling
-        if risk_prob < 30:
-            risk_level = "low"
-            risk_message_text = '✅ Low risk detected – maintain healthy lifestyle practices'
-        elif risk_prob < 70:
-            risk_level = "medium"
-            risk_message_text = '⚠️ Medium risk detected – consider lifestyle changes and medical consultation'
-        else:
-            risk_level = "high"
-            risk_message_text = '🚨 High risk detected – seek immediate medical consultation'
+        risk_level = result.risk_level
+        risk_message_text = RISK_MESSAGES[risk_level]
         
         st.markdown(f"""
         <div class="prediction-result risk-{risk_level}">
@@ -568,131 +612,183 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
-        # Risk Gauge Chart
-        chart_colors = {
-            'title_color': '#FFFFFF',
-            'axis_color': '#B3B3B3',
-            'bar_color': '#FFFFFF',
-            'paper_bg': '#1A1A1A',
-            'plot_bg': '#1A1A1A',
-            'font_color': '#FFFFFF',
-            'steps': [
-                {'range': [0, 30], 'color': '#333333'},
-                {'range': [30, 70], 'color': '#1A1A1A'},
-                {'range': [70, 100], 'color': '#0D0D0D'}
-            ]
-        }
-        
-        fig = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=risk_prob,
-            domain={'x': [0, 1], 'y': [0, 1]},
-            title={'text': "Heart Disease Risk (%)", 'font': {'color': chart_colors['title_color'], 'size': 18}},
-            gauge={
-                'axis': {'range': [None, 100], 'tickcolor': chart_colors['axis_color'], 'tickfont': {'color': chart_colors['axis_color']}},
-                'bar': {'color': chart_colors['bar_color']},
-                'steps': chart_colors['steps'],
-                'threshold': {
-                    'line': {'color': chart_colors['bar_color'], 'width': 4},
-                    'thickness': 0.75,
-                    'value': 50
-                }
-            }
-        ))
-
-        fig.update_layout(
-            height=300,
-            paper_bgcolor=chart_colors['paper_bg'],
-            plot_bgcolor=chart_colors['plot_bg'],
-            font={'color': chart_colors['font_color']}
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        # Risk Gauge Chart and per-feature contributions side by side
+        gauge_col, explain_col = st.columns(2)
+        with gauge_col:
+            with metrics.timed('app.gauge_build'):
+                fig = risk_gauge_template().patch(value=risk_prob)
+            with metrics.timed('app.gauge_render'):
+                st.plotly_chart(fig, use_container_width=True)
+        with explain_col:
+            explanation = explain(predictor, profile)
+            st.plotly_chart(build_contribution_figure(explanation, profile),
+                            use_container_width=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+    # What-If Analysis Card
+    st.markdown('<div class="dark-card">', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-header">🔬 What-If Analysis</h2>', unsafe_allow_html=True)
+
+    if st.toggle("Show how risk changes across one or two feature ranges", value=False):
+        sweepable = [name for name in feature_names if name in FEATURE_LABELS]
+        col1, col2 = st.columns(2)
+        with col1:
+            x_feature = st.selectbox("Sweep feature", sweepable,
+                                     index=sweepable.index('chol') if 'chol' in sweepable else 0,
+                                     format_func=FEATURE_LABELS.get)
+        with col2:
+            y_options = [None] + [name for name in sweepable if name != x_feature]
+            y_feature = st.selectbox("Second feature (optional)", y_options,
+                                     format_func=lambda name: "None" if name is None else FEATURE_LABELS[name])
+
+        features = (x_feature,) if y_feature is None else (x_feature, y_feature)
+        sweep_result = run_sweep(predictor, predictor.version, profile, features)
+        st.plotly_chart(build_sweep_figure(sweep_result), use_container_width=True)
+        st.caption(f"{sweep_result.risk_prob.size:,} grid points from "
+                   f"{sweep_result.rows_scored:,} profiles scored in one batch; "
+                   f"all other inputs held at the current values")
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # Batch Scoring Card
+    st.markdown('<div class="dark-card">', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-header">📁 Batch Scoring</h2>', unsafe_allow_html=True)
+
+    uploaded_file = st.file_uploader(
+        "Upload patient records (CSV or Parquet)",
+        type=['csv', 'parquet', 'pq'],
+        help=f"File must contain the columns: {', '.join(feature_names)}"
+    )
+    include_contributions = st.checkbox(
+        "Include per-feature risk contributions",
+        help="Adds a contribution_<feature> column per feature, in percentage points"
+    )
+    if uploaded_file is not None:
+        try:
+            batch_df = read_batch_file(uploaded_file)
+            with metrics.timed('app.batch_score'):
+                results_df = predictor.score_frame(batch_df, explain=include_contributions)
+        except Exception as e:
+            st.error(f"❌ Unable to score file: {e}")
+        else:
+            invalid_rows = int((results_df['risk_level'] == 'invalid').sum())
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Records Scored", f"{len(results_df) - invalid_rows}")
+            with col2:
+                st.metric("High Risk", f"{int((results_df['risk_level'] == 'high').sum())}")
+            with col3:
+                st.metric("Invalid Rows", f"{invalid_rows}")
+
+            st.dataframe(results_df.head(100), use_container_width=True)
+            st.download_button(
+                "⬇️ Download Results (CSV)",
+                data=results_df.to_csv(index=False).encode('utf-8'),
+                file_name="heart_disease_predictions.csv",
+                mime="text/csv"
+            )
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
     # Model Information Card
     st.markdown('<div class="dark-card">', unsafe_allow_html=True)
     st.markdown('<h2 class="section-header">🤖 Model Information</h2>', unsafe_allow_html=True)
     
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric("Model Type", model_info['model_type'])
     with col2:
         st.metric("Accuracy", f"{model_info['accuracy']}")
     with col3:
         st.metric("Total Features", f"{model_info.get('total_features', len(feature_names))}")
+    with col4:
+        st.metric("Model Version", predictor.version or "unknown")
+    loaded_at = pd.Timestamp(watcher.loaded_at, unit='s').strftime('%Y-%m-%d %H:%M:%S UTC')
+    st.caption(f"Active since {loaded_at} · {watcher.reloads} hot reload(s)")
+    if watcher.last_error is not None:
+        st.warning(f"Latest model files were rejected, still serving {predictor.version}: "
+                   f"{watcher.last_error}")
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+    # Population Monitoring (Accordion): everything this server process has scored
+    monitor = predictor.monitor
+    if monitor is not None:
+        with st.expander("📈 Population Monitoring", expanded=False):
+            st.metric("Predictions Observed", f"{monitor.n:,}")
+            if monitor.n:
+                risk_edges = [0] + [int(edge) for edge in monitor.edges[-1]] + [100]
+                st.caption("Predicted risk distribution")
+                st.bar_chart(pd.DataFrame(
+                    {'Share of predictions': monitor.proportions('risk_probability')},
+                    index=[f"{low}-{high}%" for low, high in zip(risk_edges, risk_edges[1:])]
+                ))
+
+            reference = load_drift_reference(predictor, predictor.version)
+            if reference is None:
+                st.info("No drift reference profile found. Build one from the training data with "
+                        "`python -m heart_risk.drift reference training.csv`.")
+            elif monitor.n < MIN_SAMPLES:
+                st.info(f"Drift scores appear after {MIN_SAMPLES} predictions "
+                        f"({monitor.n} so far).")
+            else:
+                drift_df = pd.DataFrame([
+                    {'Feature': FEATURE_LABELS.get(score.column, 'Predicted risk'),
+                     'PSI': round(score.psi, 4), 'KS': round(score.ks, 4),
+                     'Status': score.status}
+                    for score in compare(reference, monitor)
+                ])
+                st.caption(f"Drift against the reference profile ({reference.n:,} rows); "
+                           "PSI ≥ 0.1 is a moderate and ≥ 0.25 a significant shift")
+                st.dataframe(drift_df, use_container_width=True, hide_index=True)
+
+    # Prediction History (Accordion), when the prediction log is enabled
+    prediction_log = load_prediction_log(tuple(feature_names))
+    if prediction_log is not None:
+        with st.expander("🕘 Prediction History", expanded=False):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                scope = st.radio("Scope", ["This session", "All sessions"], horizontal=True)
+            with col2:
+                today = pd.Timestamp.now().date()
+                date_range = st.date_input("Date range", (today - pd.Timedelta(days=7), today))
+            with col3:
+                tiers = st.multiselect("Risk tiers", ['low', 'medium', 'high'],
+                                       default=['low', 'medium', 'high'])
+
+            if isinstance(date_range, tuple) and len(date_range) == 2:
+                start = pd.Timestamp(date_range[0]).timestamp()
+                end = (pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)).timestamp()
+            else:
+                start = end = None
+            session_id = st.session_state['session_id'] if scope == "This session" else None
+
+            counts = prediction_log.counts(start, end, session_id=session_id)
+            count_cols = st.columns(3)
+            for col, tier in zip(count_cols, ['low', 'medium', 'high']):
+                with col:
+                    st.metric(f"{tier.title()} Risk", f"{counts.get(tier, 0):,}")
+            history_df = prediction_log.query(start, end, risk_levels=tiers,
+                                              session_id=session_id, limit=500)
+            history_df['probability'] = (history_df['probability'].astype(float) * 100).round(1)
+            st.dataframe(history_df.rename(columns={'probability': 'risk_probability'}),
+                         use_container_width=True, hide_index=True)
+            st.caption("Showing the latest 500 matching predictions")
+
     # Feature Importance Chart
-    if hasattr(model, 'feature_importances_'):
+    if predictor.feature_importances_ is not None:
         st.markdown('<div class="dark-card">', unsafe_allow_html=True)
         st.markdown('<h2 class="section-header">📊 Feature Importance</h2>', unsafe_allow_html=True)
         
-        feature_importance_df = pd.DataFrame({
-            'Feature': ['Age', 'Sex', 'Chest Pain', 'Resting BP', 'Cholesterol',
-                       'Fasting Blood Sugar', 'Resting ECG', 'Max Heart Rate',
-                       'Exercise Angina', 'ST Depression', 'ST Slope',
-                       'Major Vessels', 'Thalassemia'],
-            'Importance': model.feature_importances_
-        }).sort_values('Importance', ascending=True)
-
-        fig = px.bar(
-            feature_importance_df, 
-            x='Importance', 
-            y='Feature', 
-            orientation='h',
-            title="Feature Importance in Heart Disease Prediction"
-        )
-        
-        # Apply theme colors to chart
-        chart_colors = {
-            'paper_bg': '#1A1A1A',
-            'plot_bg': '#1A1A1A',
-            'font_color': '#FFFFFF',
-            'grid_color': '#333333',
-            'axis_color': '#B3B3B3',
-            'bar_color': '#FFFFFF'
-        }
-        
-        fig.update_layout(
-            paper_bgcolor=chart_colors['paper_bg'],
-            plot_bgcolor=chart_colors['plot_bg'],
-            font={'color': chart_colors['font_color']},
-            title={'font': {'color': chart_colors['font_color']}},
-            xaxis={'gridcolor': chart_colors['grid_color'], 'color': chart_colors['axis_color']},
-            yaxis={'gridcolor': chart_colors['grid_color'], 'color': chart_colors['axis_color']}
-        )
-        
-        fig.update_traces(marker_color=chart_colors['bar_color'])
-        st.plotly_chart(fig, use_container_width=True)
+        fig = importance_figure(tuple(predictor.feature_importances_))
+        with metrics.timed('app.importance_render'):
+            st.plotly_chart(fig, use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
     # Feature Descriptions (Accordion)
     with st.expander("📖 Feature Descriptions", expanded=False):
-        feature_descriptions = {
-            "Age": "Patient age in years. Higher age generally increases cardiovascular risk.",
-            "Sex": "Biological sex (Male/Female). Males typically have higher risk at younger ages.",
-            "Chest Pain Type": "Type of chest pain: Typical angina, Atypical angina, Non-anginal pain, or Asymptomatic.",
-            "Resting Blood Pressure": "Blood pressure when at rest, measured in mmHg. Normal range: 90-140 mmHg.",
-            "Cholesterol": "Serum cholesterol level in mg/dl. Normal: <200 mg/dl, High: >240 mg/dl.",
-            "Fasting Blood Sugar": "Blood sugar level after fasting. >120 mg/dl indicates potential diabetes.",
-            "Resting ECG": "Electrocardiogram results at rest showing heart's electrical activity.",
-            "Maximum Heart Rate": "Highest heart rate achieved during exercise testing.",
-            "Exercise Induced Angina": "Whether chest pain occurs during physical exercise.",
-            "ST Depression": "Depression in ST segment during exercise, indicating potential ischemia.",
-            "ST Slope": "Slope of peak exercise ST segment (Upsloping/Flat/Downsloping).",
-            "Major Vessels": "Number of major blood vessels (0-3) visible in fluoroscopy.",
-            "Thalassemia": "Blood disorder affecting hemoglobin production and heart function."
-        }
-        
-        for feature, description in feature_descriptions.items():
-            st.markdown(f"""
-            <div class="feature-card">
-                <div class="feature-title">{feature}</div>
-                <div class="feature-description">{description}</div>
-            </div>
-            """, unsafe_allow_html=True)
+        st.markdown(feature_cards_html(), unsafe_allow_html=True)
 
     # About Section
     with st.expander("ℹ️ About This Application", expanded=False):
@@ -725,4 +821,5 @@ def main():
         st.markdown(about_content, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
+    with metrics.timed('app.script_run'):
+        main()
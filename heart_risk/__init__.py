@@ -0,0 +1,18 @@
+"""Headless heart disease risk prediction engine."""
+from .engine import (
+    BatchPrediction,
+    HeartRiskPredictor,
+    ModelFilesNotFoundError,
+    Prediction,
+    risk_level_for,
+    risk_levels_for,
+)
+
+__all__ = [
+    'BatchPrediction',
+    'HeartRiskPredictor',
+    'ModelFilesNotFoundError',
+    'Prediction',
+    'risk_level_for',
+    'risk_levels_for',
+]
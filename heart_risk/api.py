@@ -0,0 +1,300 @@
+"""Async JSON inference API with request micro-batching.
+
+Concurrent requests are gathered into micro-batches (bounded by
+``max_batch_size`` rows and ``max_wait_ms``) and each batch is scored
+with one vectorized ``predict_batch`` call in a worker thread, so the
+forest runs once per batch rather than once per HTTP request.
+
+Only the standard library is used for HTTP. Run locally with::
+
+    python -m heart_risk.api --port 8000 --max-batch-size 64 --max-wait-ms 5
+
+Endpoints::
+
+    GET  /health    -> {"status": "ok", "model_version": ...}
+    GET  /metrics   -> Prometheus text format (see heart_risk.metrics)
+    POST /predict   <- {"records": [{"age": 63, ...}, ...]}
+                       or a single record as {"record": {...}} or {...}
+                       (records may also be 13-value lists in feature order)
+                    -> {"predictions": [{"prediction": 1,
+                                         "risk_probability": 72.0,
+                                         "risk_level": "high"}, ...],
+                        "model_version": ...}
+
+Records that fail schema validation (heart_risk.schema) do not fail the
+request; their entry is ``{"error": "<reasons>"}`` instead.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error'
+}
+
+
+class MicroBatcher:
+    """Coalesce concurrent scoring requests into vectorized batches.
+
+    ``submit`` enqueues a feature matrix and resolves once the batch it was
+    placed in has been scored. A batch closes when it reaches
+    ``max_batch_size`` rows or ``max_wait_ms`` after its first request.
+    """
+
+    def __init__(self, predictor, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, executor=None):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, features):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    async def _collect(self):
+        pending = [await self._queue.get()]
+        size = len(pending[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self._collect()
+            features = np.concatenate([item[0] for item in pending])
+            try:
+                batch = await loop.run_in_executor(
+                    self.executor, self.predictor.predict_batch, features
+                )
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(features)
+            metrics.increment('api_batches')
+            metrics.set_gauge('api_last_batch_rows', len(features))
+            start = 0
+            for rows, future in pending:
+                stop = start + len(rows)
+                if not future.done():
+                    future.set_result([batch[i] for i in range(start, stop)])
+                start = stop
+
+
+def _parse_records(payload):
+    if isinstance(payload, dict) and 'records' in payload:
+        records = payload['records']
+    elif isinstance(payload, dict) and 'record' in payload:
+        records = [payload['record']]
+    else:
+        records = [payload]
+    if not isinstance(records, list) or not records:
+        raise ValueError("'records' must be a non-empty list")
+    return records
+
+
+class InferenceServer:
+    """Minimal HTTP/1.1 server (keep-alive, Content-Length bodies only)."""
+
+    def __init__(self, predictor, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.predictor = predictor
+        self.batcher = MicroBatcher(predictor, max_batch_size, max_wait_ms)
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self, host='127.0.0.1', port=8000):
+        server = await self.start(host, port)
+        logger.info("Serving on %s", ', '.join(str(s.getsockname()) for s in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request line'}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {'error': 'Invalid Content-Length'}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': 'Request body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                with metrics.timed('api.request'):
+                    status, payload = await self._dispatch(method, path.split('?', 1)[0], body)
+                metrics.increment(f'api_responses_{status}')
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        if path == '/health':
+            if method != 'GET':
+                return 405, {'error': 'Use GET'}
+            return 200, {'status': 'ok', 'model_version': self.predictor.version}
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': 'Use GET'}
+            return 200, metrics.render_prometheus()
+        if path != '/predict':
+            return 404, {'error': f'Unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST'}
+
+        try:
+            records = _parse_records(json.loads(body or b'null'))
+            validation = self.predictor.validate_records(records)
+        except KeyError as e:
+            return 400, {'error': f'Missing feature {e}'}
+        except (ValueError, TypeError) as e:
+            return 400, {'error': f'Invalid request: {e}'}
+
+        results = [{'error': error} for error in validation.errors]
+        if validation.n_invalid:
+            metrics.increment('api_invalid_records', validation.n_invalid)
+        valid_rows = np.flatnonzero(validation.valid)
+        if len(valid_rows):
+            try:
+                features = validation.features
+                if validation.n_invalid:
+                    features = features[valid_rows]
+                predictions = await self.batcher.submit(features)
+            except Exception:
+                logger.exception("Prediction failed")
+                return 500, {'error': 'Prediction failed'}
+            if self.predictor.monitor is not None:
+                self.predictor.monitor.update(features, [p.risk_prob for p in predictions])
+            for row, p in zip(valid_rows, predictions):
+                results[row] = {
+                    'prediction': p.label,
+                    'risk_probability': round(p.risk_prob, 1),
+                    'risk_level': p.risk_level
+                }
+        return 200, {'predictions': results, 'model_version': self.predictor.version}
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        # Plain strings (the /metrics page) are sent as text, the rest as JSON
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            body, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.api',
+                                     description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--backend', default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    from .engine import HeartRiskPredictor
+
+    metrics.start_log_reporter()
+
+    predictor = HeartRiskPredictor.load(backend=args.backend)
+    server = InferenceServer(predictor, args.max_batch_size, args.max_wait_ms)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
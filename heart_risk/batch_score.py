@@ -0,0 +1,211 @@
+"""Process-pool scoring for very large offline datasets.
+
+The input (CSV or Parquet) is streamed in chunks and fanned out to a pool
+of worker processes. Each worker loads the model once, from the shared
+memory-mapped bundle when one is available, and scores its chunk with
+the same HeartRiskPredictor rules as the app. Results are written to a
+CSV in input order.
+
+After every chunk the byte offset of the output and the number of
+chunks done are checkpointed to ``<output>.progress.json``. Rerunning
+with ``--resume`` truncates any partial write and continues from there;
+if the output is gone or shorter than the checkpoint, it starts over.
+
+With ``--bundle`` the workers default to the flat backend, so they all
+serve from the same memory-mapped arrays instead of each unpickling the
+forest.
+
+Usage::
+
+    python -m heart_risk.batch_score patients.csv scored.csv --workers 8 --chunk-size 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+_predictor = None
+_explain = False
+
+
+def _init_worker(bundle, backend, explain=False):
+    global _predictor, _explain
+    from .engine import HeartRiskPredictor
+
+    _explain = explain
+
+    if bundle:
+        _predictor = HeartRiskPredictor.from_bundle(bundle, backend=backend, cache=False,
+                                                    monitor=False)
+    else:
+        _predictor = HeartRiskPredictor.load(backend=backend, cache=False, monitor=False)
+
+
+def _score_chunk(frame):
+    return _predictor.score_columns(frame, explain=_explain)
+
+
+def iter_chunks(path, chunk_size):
+    """Yield DataFrame chunks of a CSV or Parquet file."""
+    if path.lower().endswith(('.parquet', '.pq')):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def _checkpoint_path(output):
+    return output + '.progress.json'
+
+
+def _read_checkpoint(output, input_path, chunk_size):
+    path = _checkpoint_path(output)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['input'] != os.path.abspath(input_path) or checkpoint['chunk_size'] != chunk_size:
+        raise SystemExit(
+            f"{path} was written for a different input or chunk size; "
+            "delete it or rerun with the original arguments"
+        )
+    return checkpoint
+
+
+def _new_checkpoint(input_path, chunk_size):
+    return {
+        'input': os.path.abspath(input_path),
+        'chunk_size': chunk_size,
+        'chunks_done': 0,
+        'rows_done': 0,
+        'output_bytes': 0
+    }
+
+
+def _check_bundle(bundle, backend):
+    from .bundle import BundleIntegrityError, read_manifest
+    from .engine import MODEL_FILES
+
+    try:
+        manifest = read_manifest(bundle)
+    except (OSError, BundleIntegrityError) as e:
+        raise SystemExit(f"Cannot read bundle {bundle}: {e}")
+    if backend == 'sklearn' and MODEL_FILES['model'] not in manifest['files']:
+        raise SystemExit(f"{bundle} does not include the sklearn model (compact bundle?); "
+                         "use --backend flat")
+
+
+def _write_checkpoint(output, checkpoint):
+    path = _checkpoint_path(output)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def score_file(input_path, output_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               bundle=None, backend=None, resume=False, progress=None, explain=False):
+    """Score ``input_path`` into ``output_path``; returns the number of rows written.
+
+    ``backend`` defaults as in :meth:`HeartRiskPredictor.from_bundle` (flat
+    unless ``HEART_RISK_BACKEND`` says otherwise) with a ``bundle``.
+    """
+    workers = workers or os.cpu_count() or 1
+    if bundle:
+        backend = backend or os.environ.get('HEART_RISK_BACKEND', 'flat')
+        _check_bundle(bundle, backend)
+    checkpoint = _read_checkpoint(output_path, input_path, chunk_size) if resume else None
+    if checkpoint is not None and (
+            not os.path.exists(output_path) or
+            os.path.getsize(output_path) < checkpoint['output_bytes']):
+        print(f"{output_path} is missing or incomplete; starting over", file=sys.stderr)
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = _new_checkpoint(input_path, chunk_size)
+
+    mode = 'r+b' if checkpoint['chunks_done'] else 'wb'
+    started = time.perf_counter()
+    rows_this_run = 0
+    with open(output_path, mode) as out, \
+            ProcessPoolExecutor(workers, initializer=_init_worker,
+                                initargs=(bundle, backend, explain)) as pool:
+        # Drop anything written after the last checkpoint
+        out.seek(checkpoint['output_bytes'])
+        out.truncate()
+
+        chunks = iter_chunks(input_path, chunk_size)
+        for _ in range(checkpoint['chunks_done']):
+            next(chunks, None)
+
+        # Keep a bounded window of chunks in flight and write them in order
+        in_flight = []
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < workers * 2:
+                frame = next(chunks, None)
+                if frame is None:
+                    exhausted = True
+                else:
+                    in_flight.append((frame, pool.submit(_score_chunk, frame)))
+            if not in_flight:
+                break
+
+            frame, future = in_flight.pop(0)
+            for name, values in future.result().items():
+                frame[name] = values
+            header = checkpoint['chunks_done'] == 0
+            out.write(frame.to_csv(index=False, header=header).encode('utf-8'))
+            out.flush()
+
+            checkpoint['chunks_done'] += 1
+            checkpoint['rows_done'] += len(frame)
+            checkpoint['output_bytes'] = out.tell()
+            _write_checkpoint(output_path, checkpoint)
+
+            rows_this_run += len(frame)
+            if progress is not None:
+                progress(checkpoint['rows_done'], rows_this_run / (time.perf_counter() - started))
+
+    os.remove(_checkpoint_path(output_path))
+    return checkpoint['rows_done']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.batch_score',
+                                     description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', help='CSV or Parquet file with the 13 feature columns')
+    parser.add_argument('output', help='CSV file to write')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--bundle', default=None, help='Model bundle directory')
+    parser.add_argument('--backend', default=None,
+                        help="'flat' (the default with --bundle) serves from the bundle's "
+                             "memory-mapped arrays; 'sklearn' is fastest for large chunks")
+    parser.add_argument('--explain', action='store_true',
+                        help='Add per-feature risk contribution columns')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the checkpoint of an interrupted run')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    def progress(rows, rate):
+        print(f"\r{rows:,} rows scored ({rate:,.0f} rows/s)", end='', file=sys.stderr, flush=True)
+
+    rows = score_file(args.input, args.output, workers=args.workers,
+                      chunk_size=args.chunk_size, bundle=args.bundle,
+                      backend=args.backend, resume=args.resume, explain=args.explain,
+                      progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(f"\nWrote {rows:,} rows to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Versioned, integrity-checked model bundle.
+
+A bundle is one directory holding everything the predictor needs::
+
+    model_bundle/
+        manifest.json                       # version, hashes, feature order, model_info
+        forest/*.npy, forest/forest.json    # FlatForest node arrays
+        heart_disease_model_optimized.pkl   # original sklearn forest (optional)
+
+The forest arrays are loaded with ``mmap_mode='r'``, so loading is a few
+``open`` calls rather than unpickling 100 estimator objects. Rebuilding
+into a served directory is safe: every file is renamed into place rather
+than overwritten, so running processes keep their old mappings. N Streamlit
+or worker processes on one host also share the tree pages through the
+page cache instead of each holding a private copy. The sklearn pickle is
+only read when the ``sklearn`` backend or a parity check asks for it.
+
+Usage::
+
+    python -m heart_risk.bundle build [--source DIR] [--out model_bundle]
+    python -m heart_risk.bundle verify model_bundle
+    python -m heart_risk.bundle coldstart [--bundle model_bundle]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .coldstart import COLD_START_PROFILE, measure
+from .engine import MODEL_FILES, file_sha256
+
+FORMAT_VERSION = 1
+BUNDLE_DIRNAME = 'model_bundle'
+MANIFEST_NAME = 'manifest.json'
+FOREST_DIRNAME = 'forest'
+
+
+class BundleIntegrityError(ValueError):
+    """Raised when a bundle file is missing or does not match its manifest hash."""
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def build_bundle(predictor, out_dir, include_model=True, forest=None, variant=None):
+    """Write ``predictor`` (loaded from pickles) as a bundle and return the manifest.
+
+    ``forest`` replaces the predictor's own forest with a derived one (see
+    :mod:`heart_risk.compact`), described by the ``variant`` mapping. Such
+    a bundle never ships the sklearn pickle, and its model hash is derived
+    from the source hash and the variant, so caches and lookup tables
+    built for the full model are not reused for it.
+    """
+    from .flat_forest import FlatForest
+
+    if predictor.model is None:
+        raise ValueError("Building a bundle needs the sklearn model")
+    os.makedirs(out_dir, exist_ok=True)
+
+    model_hash = predictor.model_hash
+    if forest is not None:
+        include_model = False
+        model_hash = hashlib.sha256(
+            f"{model_hash}:{json.dumps(variant, sort_keys=True)}".encode('utf-8')
+        ).hexdigest()
+    forest = forest or predictor.forest or FlatForest.from_sklearn(predictor.model)
+    written = forest.save(os.path.join(out_dir, FOREST_DIRNAME))
+    if include_model:
+        target = os.path.join(out_dir, MODEL_FILES['model'])
+        shutil.copyfile(os.path.join(predictor.source_dir, MODEL_FILES['model']), target + '.tmp')
+        os.replace(target + '.tmp', target)
+        written.append(target)
+
+    created = datetime.now(timezone.utc)
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': f"{created:%Y%m%d%H%M%S}-{model_hash[:12]}",
+        'created': created.isoformat(timespec='seconds'),
+        'model_hash': model_hash,
+        'source_model_hash': predictor.model_hash,
+        'variant': variant,
+        'feature_names': predictor.feature_names,
+        'model_info': predictor.model_info,
+        'feature_importances': predictor.feature_importances_,
+        'forest': {
+            'n_estimators': forest.n_estimators,
+            'node_count': forest.node_count,
+            'max_depth': forest.max_depth
+        },
+        'files': {
+            os.path.relpath(path, out_dir): {
+                'sha256': file_sha256(path),
+                'bytes': os.path.getsize(path)
+            }
+            for path in written
+        }
+    }
+    # The manifest goes last: a watcher (see :mod:`heart_risk.reload`) only
+    # reloads once it changes, by which time every file it lists is in place
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, default=_to_json)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def read_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise BundleIntegrityError(
+            f"Unsupported bundle format {manifest.get('format_version')!r}"
+        )
+    return manifest
+
+
+def verify_bundle(bundle_dir, manifest=None):
+    """Check every file listed in the manifest against its SHA-256."""
+    manifest = manifest or read_manifest(bundle_dir)
+    for name, entry in manifest['files'].items():
+        path = os.path.join(bundle_dir, name)
+        if not os.path.exists(path):
+            raise BundleIntegrityError(f"Bundle file missing: {name}")
+        if file_sha256(path) != entry['sha256']:
+            raise BundleIntegrityError(f"Bundle file corrupted: {name}")
+    return manifest
+
+
+def is_bundle(directory):
+    return os.path.exists(os.path.join(directory, MANIFEST_NAME))
+
+
+def load_bundle(bundle_dir, verify=True, load_model=False, mmap_mode='r'):
+    """Return ``(forest, model, manifest)`` from a bundle directory.
+
+    ``model`` is None unless ``load_model`` is set and the bundle ships
+    the sklearn pickle.
+    """
+    from .flat_forest import FlatForest
+
+    manifest = read_manifest(bundle_dir)
+    if verify:
+        verify_bundle(bundle_dir, manifest)
+    forest = FlatForest.load(os.path.join(bundle_dir, FOREST_DIRNAME), mmap_mode=mmap_mode)
+
+    model = None
+    if load_model:
+        if MODEL_FILES['model'] not in manifest['files']:
+            raise BundleIntegrityError("Bundle does not include the sklearn model")
+        import joblib
+
+        model = joblib.load(os.path.join(bundle_dir, MODEL_FILES['model']))
+    return forest, model, manifest
+
+
+def measure_cold_start(source_dir, bundle_dir=None, repeat=3):
+    """Time import + load + first prediction in fresh interpreters.
+
+    Returns ``{variant: (best seconds, peak RSS in KB)}``.
+    """
+    variants = {
+        'pickles (sklearn)': f"HeartRiskPredictor.from_directory({source_dir!r}, backend='sklearn')",
+        'pickles (flat)': f"HeartRiskPredictor.from_directory({source_dir!r}, backend='flat')",
+    }
+    if bundle_dir:
+        variants['bundle (flat, mmap)'] = f"HeartRiskPredictor.from_bundle({bundle_dir!r})"
+    return {
+        name: measure(f"from heart_risk import HeartRiskPredictor\n"
+                      f"predictor = {load}\n"
+                      f"predictor.predict_one({COLD_START_PROFILE!r})", repeat)
+        for name, load in variants.items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.bundle',
+                                     description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Build a bundle from the pickled model files')
+    build.add_argument('--source', default=None, help='Directory with the .pkl files')
+    build.add_argument('--out', default=BUNDLE_DIRNAME)
+    build.add_argument('--no-model', action='store_true',
+                       help='Omit the sklearn pickle (flat backend only)')
+
+    verify = commands.add_parser('verify', help='Check bundle file hashes')
+    verify.add_argument('path', nargs='?', default=BUNDLE_DIRNAME)
+
+    coldstart = commands.add_parser('coldstart', help='Measure cold start per load path')
+    coldstart.add_argument('--source', default=None)
+    coldstart.add_argument('--bundle', default=None)
+    coldstart.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args(argv)
+    from .engine import HeartRiskPredictor
+
+    if args.command == 'build':
+        if args.source:
+            predictor = HeartRiskPredictor.from_directory(args.source, backend='flat')
+        else:
+            predictor = HeartRiskPredictor.load(backend='flat', prefer_bundle=False)
+        manifest = build_bundle(predictor, args.out, include_model=not args.no_model)
+        size = sum(entry['bytes'] for entry in manifest['files'].values())
+        print(f"Wrote bundle {manifest['version']} to {args.out} ({size / 1e3:.0f} KB)")
+    elif args.command == 'verify':
+        manifest = verify_bundle(args.path)
+        print(f"OK: bundle {manifest['version']}, {len(manifest['files'])} files verified")
+    else:
+        source = args.source or HeartRiskPredictor.load(prefer_bundle=False).source_dir
+        for name, (seconds, rss_kb) in measure_cold_start(source, args.bundle, args.repeat).items():
+            print(f"{name:<22} {seconds * 1000:8.1f} ms   peak RSS {rss_kb / 1024:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Bounded, thread-safe LRU cache for single-patient predictions."""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+def canonical_key(features):
+    """Canonical tuple for a feature vector.
+
+    Values are rounded to the 0.1 resolution of the finest input widget
+    (``oldpeak``), so 1, 1.0 and 1.0000001 all share one entry.
+    """
+    return tuple(np.round(np.asarray(features, dtype=np.float64).ravel(), 1).tolist())
+
+
+class PredictionCache:
+    """LRU mapping from canonical feature tuples to predictions.
+
+    The cache is bound to a model hash; binding it to a different hash
+    drops every entry, so a retrained model never serves stale results.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.model_hash = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def empty_copy(self):
+        return PredictionCache(self.maxsize)
+
+    def bind(self, model_hash):
+        with self._lock:
+            if model_hash != self.model_hash:
+                self._entries.clear()
+                self.model_hash = model_hash
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
@@ -0,0 +1,223 @@
+"""Themed Plotly figures for the app, built once and patched per request.
+
+Two things make a chart expensive per Streamlit rerun: building the
+figure (plotly validates every property as it is set) and the JSON that
+``st.plotly_chart`` serializes and sends over the websocket.
+
+* :class:`FigureTemplate` builds and validates a themed figure once and
+  keeps its serialized form. :meth:`FigureTemplate.patch` returns a new
+  figure with only some trace properties replaced (e.g. the gauge
+  value). That figure is assembled from the cached spec without running
+  validation again.
+* :data:`CHART_TEMPLATE` replaces plotly's default ``"plotly"`` template,
+  which adds about 6.5 KB of trace defaults to every chart. It carries
+  only the dark theme colours. Figures also set those colours on
+  themselves (:data:`THEME_LAYOUT`), because Streamlit's chart theme
+  overrides template values.
+
+Plotly is imported lazily, so importing this module stays cheap.
+"""
+
+CHART_COLORS = {
+    'paper_bg': '#1A1A1A',
+    'plot_bg': '#1A1A1A',
+    'font_color': '#FFFFFF',
+    'grid_color': '#333333',
+    'axis_color': '#B3B3B3',
+    'bar_color': '#FFFFFF',
+    'line_color': '#FFFFFF',
+    'marker_color': '#DC3545',
+    'increase_color': '#DC3545',
+    'decrease_color': '#28A745'
+}
+
+# Set on every figure itself: st.plotly_chart's default "streamlit" theme
+# restyles the template's layout but keeps values set on the figure
+THEME_LAYOUT = {
+    'paper_bgcolor': CHART_COLORS['paper_bg'],
+    'plot_bgcolor': CHART_COLORS['plot_bg'],
+    'font': {'color': CHART_COLORS['font_color']}
+}
+AXIS_STYLE = {'gridcolor': CHART_COLORS['grid_color'], 'color': CHART_COLORS['axis_color']}
+
+CHART_TEMPLATE = {'layout': dict(THEME_LAYOUT, xaxis=AXIS_STYLE, yaxis=AXIS_STYLE)}
+
+IMPORTANCE_LABELS = ['Age', 'Sex', 'Chest Pain', 'Resting BP', 'Cholesterol',
+                     'Fasting Blood Sugar', 'Resting ECG', 'Max Heart Rate',
+                     'Exercise Angina', 'ST Depression', 'ST Slope',
+                     'Major Vessels', 'Thalassemia']
+
+
+# Short axis labels for the what-if sweeps, keyed by model feature name
+FEATURE_LABELS = {
+    'age': 'Age (years)',
+    'sex': 'Sex',
+    'cp': 'Chest Pain Type',
+    'trestbps': 'Resting BP (mmHg)',
+    'chol': 'Cholesterol (mg/dl)',
+    'fbs': 'Fasting Blood Sugar > 120',
+    'restecg': 'Resting ECG',
+    'thalach': 'Max Heart Rate (bpm)',
+    'exang': 'Exercise Angina',
+    'oldpeak': 'ST Depression',
+    'slope': 'ST Slope',
+    'ca': 'Major Vessels',
+    'thal': 'Thalium Stress Result'
+}
+
+
+class FigureTemplate:
+    """A validated figure kept as its plotly JSON spec.
+
+    The spec is shared and never mutated; :meth:`patch` copies only the
+    trace it changes, so one template can serve every session.
+    """
+
+    def __init__(self, figure):
+        self.spec = figure.to_plotly_json()
+
+    def patch(self, trace=0, **properties):
+        """A figure equal to the template with ``properties`` set on one trace."""
+        import plotly.graph_objects as go
+
+        data = list(self.spec['data'])
+        data[trace] = dict(data[trace], **properties)
+        # The spec was validated when the template was built
+        return go.Figure(data=data, layout=self.spec['layout'], _validate=False)
+
+
+def build_risk_gauge(risk_prob):
+    import plotly.graph_objects as go
+
+    chart_colors = {
+        'title_color': '#FFFFFF',
+        'axis_color': '#B3B3B3',
+        'bar_color': '#FFFFFF',
+        'steps': [
+            {'range': [0, 30], 'color': '#333333'},
+            {'range': [30, 70], 'color': '#1A1A1A'},
+            {'range': [70, 100], 'color': '#0D0D0D'}
+        ]
+    }
+
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=risk_prob,
+        domain={'x': [0, 1], 'y': [0, 1]},
+        title={'text': "Heart Disease Risk (%)", 'font': {'color': chart_colors['title_color'], 'size': 18}},
+        gauge={
+            'axis': {'range': [None, 100], 'tickcolor': chart_colors['axis_color'], 'tickfont': {'color': chart_colors['axis_color']}},
+            'bar': {'color': chart_colors['bar_color']},
+            'steps': chart_colors['steps'],
+            'threshold': {
+                'line': {'color': chart_colors['bar_color'], 'width': 4},
+                'thickness': 0.75,
+                'value': 50
+            }
+        }
+    ))
+
+    # Assigned, not passed to update_layout, which would merge into the default
+    fig.layout.template = CHART_TEMPLATE
+    fig.update_layout(height=300, **THEME_LAYOUT)
+    return fig
+
+
+def build_importance_figure(importances):
+    import pandas as pd
+    import plotly.express as px
+
+    feature_importance_df = pd.DataFrame({
+        'Feature': IMPORTANCE_LABELS,
+        'Importance': importances
+    }).sort_values('Importance', ascending=True)
+
+    fig = px.bar(
+        feature_importance_df,
+        x='Importance',
+        y='Feature',
+        orientation='h',
+        title="Feature Importance in Heart Disease Prediction",
+        template=CHART_TEMPLATE
+    )
+    fig.update_layout(title={'font': {'color': CHART_COLORS['font_color']}},
+                      xaxis=AXIS_STYLE, yaxis=AXIS_STYLE, **THEME_LAYOUT)
+    fig.update_traces(marker_color=CHART_COLORS['bar_color'])
+    return fig
+
+
+def build_sweep_figure(result):
+    """Risk along one feature (step line) or two (heatmap) from a
+    :func:`heart_risk.whatif.sweep` result, marking the current profile."""
+    import plotly.graph_objects as go
+
+    x_label = FEATURE_LABELS.get(result.features[0], result.features[0])
+    if len(result.features) == 1:
+        fig = go.Figure(go.Scatter(
+            x=result.axes[0], y=result.risk_prob.round(1), mode='lines',
+            line={'color': CHART_COLORS['line_color'], 'width': 3, 'shape': 'hv'},
+            hovertemplate=f"{x_label}: %{{x}}<br>Risk: %{{y:.1f}}%<extra></extra>"
+        ))
+        for level in (30, 70):
+            fig.add_hline(y=level, line_dash='dot', line_color=CHART_COLORS['grid_color'])
+        fig.add_vline(x=result.current[0], line_dash='dash', line_color=CHART_COLORS['axis_color'],
+                      annotation_text='Current', annotation_font_color=CHART_COLORS['axis_color'])
+        fig.update_layout(xaxis_title=x_label, yaxis_title='Risk (%)', yaxis_range=[0, 100])
+    else:
+        y_label = FEATURE_LABELS.get(result.features[1], result.features[1])
+        fig = go.Figure(go.Heatmap(
+            x=result.axes[0], y=result.axes[1], z=result.risk_prob.T.round(1),
+            zmin=0, zmax=100, colorscale=[[0, '#0D0D0D'], [0.5, '#666666'], [1, '#FFFFFF']],
+            colorbar={'title': 'Risk (%)'},
+            hovertemplate=f"{x_label}: %{{x}}<br>{y_label}: %{{y}}<br>Risk: %{{z:.1f}}%<extra></extra>"
+        ))
+        fig.add_trace(go.Scatter(
+            x=[result.current[0]], y=[result.current[1]], mode='markers', name='Current',
+            marker={'color': CHART_COLORS['marker_color'], 'size': 12, 'symbol': 'x'}, showlegend=False
+        ))
+        fig.update_layout(xaxis_title=x_label, yaxis_title=y_label)
+
+    fig.layout.template = CHART_TEMPLATE
+    fig.update_layout(height=400, xaxis=AXIS_STYLE, yaxis=AXIS_STYLE, **THEME_LAYOUT)
+    return fig
+
+
+def build_contribution_figure(explanation, profile, top_n=8):
+    """Horizontal bars of the ``top_n`` largest feature contributions of a
+    :func:`heart_risk.explain.explain` result, labelled with ``profile``'s values."""
+    import plotly.graph_objects as go
+
+    values = dict(zip(explanation.feature_names, profile))
+    # Largest effects last so they sit at the top of the horizontal bars
+    top = explanation.top(0, top_n)[::-1]
+    labels = [f"{FEATURE_LABELS.get(name, name)} = {values[name]:g}" for name, _ in top]
+    contributions = [contribution for _, contribution in top]
+
+    fig = go.Figure(go.Bar(
+        x=contributions, y=labels, orientation='h',
+        marker_color=[CHART_COLORS['increase_color'] if c > 0 else CHART_COLORS['decrease_color']
+                      for c in contributions],
+        hovertemplate="%{y}<br>%{x:+.1f} points<extra></extra>"
+    ))
+    fig.layout.template = CHART_TEMPLATE
+    fig.update_layout(
+        height=300,
+        title={'text': f"What drives this risk (baseline {explanation.bias:.0f}%)",
+               'font': {'color': CHART_COLORS['font_color'], 'size': 16}},
+        xaxis_title='Contribution to risk (percentage points)',
+        margin={'l': 10, 'r': 10, 't': 50, 'b': 40},
+        xaxis=dict(AXIS_STYLE, zerolinecolor=CHART_COLORS['axis_color']),
+        yaxis=AXIS_STYLE,
+        **THEME_LAYOUT
+    )
+    return fig
+
+
+def serialize(figure):
+    """The JSON spec ``st.plotly_chart`` sends for ``figure``, produced the
+    same way, for measuring build and payload cost."""
+    import plotly.io as pio
+    import plotly.tools
+
+    figure = plotly.tools.return_figure_from_figure_or_data(figure, validate_figure=True)
+    return pio.to_json(figure, validate=False)
@@ -0,0 +1,44 @@
+"""Cold-start timing in fresh interpreters.
+
+:func:`measure` runs a snippet (typically the imports, the model load and
+a first prediction) in a new Python process, so import time and page
+faults are counted. It reports the wall time of the snippet and the
+child's peak RSS (VmHWM, which unlike ``ru_maxrss`` is not inherited
+from the parent across exec).
+"""
+import os
+import subprocess
+import sys
+
+# Profile scored by the first prediction of every cold-start run
+COLD_START_PROFILE = [50, 1, 0, 120, 200, 0, 1, 150, 0, 1.0, 1, 0, 3]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCRIPT = """
+import sys
+import time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+with open('/proc/self/status') as f:
+    peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+print(elapsed, peak_kb)
+"""
+
+
+def measure(code, repeat=3, cwd=None):
+    """Best of ``repeat`` fresh-interpreter runs of ``code``, as
+    ``(seconds, peak RSS in KB)``. ``heart_risk`` is importable in the child
+    whatever ``cwd`` is."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])
+    ))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', _SCRIPT.format(code=code)],
+            check=True, capture_output=True, text=True, env=env, cwd=cwd
+        ).stdout.split()
+        runs.append((float(output[0]), int(output[1])))
+    return min(runs)
@@ -0,0 +1,308 @@
+"""Reduced-footprint variants of the flattened forest.
+
+Three independent reductions, applied to a :class:`FlatForest`:
+
+* **Tree subsampling** – :func:`select_trees` greedily picks the trees
+  whose average best tracks the full forest's probabilities on a sample
+  (the reference inputs, or real rows when given).
+* **Leaf merging** – :func:`merge_leaves` collapses splits whose two
+  leaves predict the same risk (within ``tolerance``) into one leaf.
+  Every node already holds the sample-weighted mean of its children, so
+  the collapsed split keeps that value.
+* **Compact dtypes** – :func:`compact_dtypes` stores features as int8,
+  values as float32 and, optionally, node indices in the smallest integer
+  type that fits. Thresholds are rounded *down* to float32, which is
+  exact: inputs are compared as float32, and ``x <= t`` for a float32
+  ``x`` holds exactly when ``x`` is at most the largest float32 not
+  above ``t``. NumPy converts narrow indices back to intp on every
+  gather, so narrow indices trade single-row latency for size.
+
+:func:`report` measures size, single-row latency and fidelity (and
+accuracy, given labelled data) for a ladder of variants. ``build`` writes
+one as a model bundle; point ``HEART_RISK_BUNDLE`` at it to serve it.
+
+Usage::
+
+    python -m heart_risk.compact report [--data heart.csv --target target]
+    python -m heart_risk.compact build --trees 50 [--leaf-tolerance 0.01]
+                                       [--narrow-indices] [--out model_bundle_compact]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from .flat_forest import ARRAY_NAMES, FlatForest
+
+DEFAULT_TREE_COUNTS = (100, 50, 25, 10)
+LATENCY_CALLS = 500
+
+
+def forest_nbytes(forest):
+    return sum(getattr(forest, name).nbytes for name in ARRAY_NAMES)
+
+
+def _reachable(forest, roots):
+    """Mask of nodes reachable from ``roots`` and the deepest path length."""
+    reachable = np.zeros(forest.node_count, dtype=bool)
+    frontier = np.asarray(roots, dtype=np.intp)
+    depth = 0
+    while len(frontier):
+        reachable[frontier] = True
+        internal = frontier[forest.children_left[frontier] != frontier]
+        if not len(internal):
+            break
+        depth += 1
+        frontier = np.concatenate([forest.children_left[internal],
+                                   forest.children_right[internal]]).astype(np.intp)
+    return reachable, depth
+
+
+def _subforest(forest, roots):
+    """Copy of ``forest`` holding only the trees under ``roots``, renumbered."""
+    keep, max_depth = _reachable(forest, roots)
+    new_index = np.full(forest.node_count, -1, dtype=np.intp)
+    new_index[keep] = np.arange(np.count_nonzero(keep))
+    return FlatForest(
+        feature=np.asarray(forest.feature)[keep],
+        threshold=np.asarray(forest.threshold)[keep],
+        children_left=new_index[np.asarray(forest.children_left)[keep]],
+        children_right=new_index[np.asarray(forest.children_right)[keep]],
+        value=np.asarray(forest.value)[keep],
+        roots=new_index[np.asarray(roots, dtype=np.intp)],
+        classes=forest.classes_,
+        n_features=forest.n_features,
+        max_depth=max_depth
+    )
+
+
+def tree_probabilities(forest, X, class_index=1):
+    """Per-tree ``class_index`` probability, shape (n_rows, n_trees)."""
+    return np.asarray(forest.value)[forest.apply(X), class_index].astype(np.float64)
+
+
+def select_trees(forest, n_trees, X):
+    """Greedy forward selection of ``n_trees`` trees whose mean stays
+    closest (mean absolute error) to the full forest's probability on ``X``.
+
+    Returns the chosen tree positions in selection order.
+    """
+    per_tree = tree_probabilities(forest, X)
+    target = per_tree.mean(axis=1, keepdims=True)
+    chosen = []
+    total = np.zeros((len(per_tree), 1))
+    available = np.ones(per_tree.shape[1], dtype=bool)
+    for k in range(1, min(n_trees, per_tree.shape[1]) + 1):
+        errors = np.abs((total + per_tree) / k - target).mean(axis=0)
+        errors[~available] = np.inf
+        best = int(errors.argmin())
+        chosen.append(best)
+        available[best] = False
+        total[:, 0] += per_tree[:, best]
+    return chosen
+
+
+def subsample(forest, n_trees, X):
+    """:func:`select_trees` applied: a FlatForest of ``n_trees`` trees."""
+    if n_trees >= forest.n_estimators:
+        return forest
+    chosen = sorted(select_trees(forest, n_trees, X))
+    return _subforest(forest, np.asarray(forest.roots)[chosen])
+
+
+def merge_leaves(forest, tolerance=0.0, class_index=1):
+    """Collapse splits whose two children are leaves predicting within
+    ``tolerance`` of each other, repeatedly, then drop orphaned nodes."""
+    feature = np.array(forest.feature)
+    threshold = np.array(forest.threshold)
+    left = np.array(forest.children_left)
+    right = np.array(forest.children_right)
+    value = np.asarray(forest.value)[:, class_index]
+    nodes = np.arange(forest.node_count)
+    while True:
+        is_leaf = left == nodes
+        mergeable = (~is_leaf & is_leaf[left] & is_leaf[right] &
+                     (np.abs(value[left] - value[right]) <= tolerance))
+        if not mergeable.any():
+            break
+        left[mergeable] = right[mergeable] = nodes[mergeable]
+        feature[mergeable] = 0
+        threshold[mergeable] = 0.0
+    merged = FlatForest(feature, threshold, left, right, forest.value, forest.roots,
+                        forest.classes_, forest.n_features, forest.max_depth)
+    return _subforest(merged, merged.roots)
+
+
+def _float32_floor(values):
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def compact_dtypes(forest, narrow_indices=True):
+    """Copy of ``forest`` with the narrowest dtypes that keep its splits exact."""
+    index_dtype = np.intp
+    if narrow_indices:
+        index_dtype = np.int16 if forest.node_count <= np.iinfo(np.int16).max else np.int32
+    return FlatForest(
+        feature=np.asarray(forest.feature).astype(np.int8 if forest.n_features <= 127
+                                                  else np.int16),
+        threshold=_float32_floor(forest.threshold),
+        children_left=np.asarray(forest.children_left).astype(index_dtype),
+        children_right=np.asarray(forest.children_right).astype(index_dtype),
+        value=np.asarray(forest.value).astype(np.float32),
+        roots=np.asarray(forest.roots).astype(index_dtype),
+        classes=forest.classes_,
+        n_features=forest.n_features,
+        max_depth=forest.max_depth
+    )
+
+
+def compact(forest, n_trees=None, leaf_tolerance=0.0, dtypes=True, narrow_indices=True,
+            X=None):
+    """Apply the reductions in order: subsample, merge leaves, narrow dtypes.
+
+    ``X`` is the sample tree selection tracks; defaults to the reference inputs.
+    """
+    from .engine import reference_inputs
+
+    if n_trees is not None:
+        forest = subsample(forest, n_trees, reference_inputs() if X is None else X)
+    forest = merge_leaves(forest, leaf_tolerance)
+    if dtypes:
+        forest = compact_dtypes(forest, narrow_indices)
+    return forest
+
+
+def single_row_latency_us(forest, rows, calls=LATENCY_CALLS):
+    """Median single-row predict_proba time in microseconds."""
+    for row in rows[:20]:  # Warm up
+        forest.predict_proba(row)
+    timings = np.empty(calls)
+    for i in range(calls):
+        row = rows[i % len(rows)]
+        started = time.perf_counter()
+        forest.predict_proba(row)
+        timings[i] = time.perf_counter() - started
+    return float(np.median(timings) * 1e6)
+
+
+def evaluate(forest, full, X, y=None):
+    """Size, latency and fidelity to ``full`` (plus accuracy if ``y``) as a dict."""
+    probabilities = forest.predict_proba(X)[:, 1]
+    expected = full.predict_proba(X)[:, 1]
+    labels = forest.predict(X)
+    row = {
+        'trees': forest.n_estimators,
+        'nodes': forest.node_count,
+        'kbytes': forest_nbytes(forest) / 1e3,
+        'latency_us': single_row_latency_us(forest, X[:256]),
+        'max_abs_dp': float(np.abs(probabilities - expected).max()),
+        'label_agreement': float(np.mean(labels == full.predict(X)))
+    }
+    if y is not None:
+        row['accuracy'] = float(np.mean(labels == np.asarray(y)))
+    return row
+
+
+def report(full, X, y=None, tree_counts=DEFAULT_TREE_COUNTS, leaf_tolerance=0.0):
+    """:func:`evaluate` rows for the full forest and, per tree count, the
+    subsampled forest, then with merged leaves and compact dtypes (wide
+    and narrow node indices)."""
+    rows = [dict(variant='full', **evaluate(full, full, X, y))]
+    for n_trees in tree_counts:
+        reduced = subsample(full, n_trees, X)
+        if reduced is not full:
+            rows.append(dict(variant=f'{n_trees} trees', **evaluate(reduced, full, X, y)))
+        merged = merge_leaves(reduced, leaf_tolerance)
+        for narrow_indices, suffix in ((False, 'f32'), (True, 'f32+i16')):
+            packed = compact_dtypes(merged, narrow_indices)
+            rows.append(dict(variant=f'{n_trees} trees {suffix}', **evaluate(packed, full, X, y)))
+    return rows
+
+
+def format_report(rows):
+    header = (f"{'variant':<20} {'trees':>5} {'nodes':>6} {'KB':>7} {'p50 us':>7} "
+              f"{'max |dp|':>9} {'agree':>6}")
+    has_accuracy = 'accuracy' in rows[0]
+    if has_accuracy:
+        header += f" {'acc':>6}"
+    lines = [header]
+    for row in rows:
+        line = (f"{row['variant']:<20} {row['trees']:>5} {row['nodes']:>6} "
+                f"{row['kbytes']:>7.1f} {row['latency_us']:>7.1f} {row['max_abs_dp']:>9.4f} "
+                f"{row['label_agreement']:>6.3f}")
+        if has_accuracy:
+            line += f" {row['accuracy']:>6.3f}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.compact',
+                                     description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report_parser = commands.add_parser('report', help='Size/latency/accuracy per variant')
+    report_parser.add_argument('--trees', type=int, nargs='+', default=list(DEFAULT_TREE_COUNTS))
+
+    build = commands.add_parser('build', help='Write a compact variant as a model bundle')
+    build.add_argument('--trees', type=int, default=None, help='Trees to keep (default all)')
+    build.add_argument('--out', default='model_bundle_compact')
+    build.add_argument('--no-compact-dtypes', action='store_true',
+                       help='Keep float64 / intp node arrays')
+    build.add_argument('--narrow-indices', action='store_true',
+                       help='Store node indices as int16/int32 (smaller, slower per row)')
+
+    for command in (report_parser, build):
+        command.add_argument('--source', default=None, help='Directory with the .pkl files')
+        command.add_argument('--leaf-tolerance', type=float, default=0.0,
+                             help='Merge sibling leaves whose risk differs by at most this')
+        command.add_argument('--data', default=None,
+                             help='CSV of real rows to select trees on (and score accuracy)')
+        command.add_argument('--target', default='target', help='Label column in --data')
+
+    args = parser.parse_args(argv)
+    from .engine import HeartRiskPredictor, reference_inputs
+
+    if args.source:
+        predictor = HeartRiskPredictor.from_directory(args.source, backend='flat', cache=False,
+                                                      monitor=False)
+    else:
+        predictor = HeartRiskPredictor.load(backend='flat', prefer_bundle=False, cache=False,
+                                            monitor=False)
+    full = predictor.forest
+
+    y = None
+    if args.data:
+        import pandas as pd
+
+        frame = pd.read_csv(args.data)
+        X = predictor.as_features(frame)
+        if args.target in frame.columns:
+            y = frame[args.target].to_numpy()
+    else:
+        X = reference_inputs()
+
+    if args.command == 'report':
+        print(format_report(report(full, X, y, args.trees, args.leaf_tolerance)))
+        return
+
+    from .bundle import build_bundle
+
+    forest = compact(full, args.trees, args.leaf_tolerance, dtypes=not args.no_compact_dtypes,
+                     narrow_indices=args.narrow_indices, X=X)
+    variant = {'n_trees': forest.n_estimators, 'leaf_tolerance': args.leaf_tolerance,
+               'compact_dtypes': not args.no_compact_dtypes,
+               'narrow_indices': args.narrow_indices and not args.no_compact_dtypes}
+    manifest = build_bundle(predictor, args.out, forest=forest, variant=variant)
+    size = sum(entry['bytes'] for entry in manifest['files'].values())
+    print(format_report([dict(variant='built', **evaluate(forest, full, X, y))]))
+    print(f"Wrote bundle {manifest['version']} to {args.out} ({size / 1e3:.0f} KB); "
+          f"serve it with HEART_RISK_BUNDLE={args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""Streaming input-drift and prediction-distribution monitoring.
+
+A :class:`DistributionProfile` keeps one fixed-bin histogram per input
+feature and one for the predicted risk. Bins come from the feature schema
+(one per categorical code, equal-width over the widget range otherwise),
+so memory is constant and each observation is a bisect per column.
+
+Drift against a stored reference profile is scored per column with the
+population stability index (PSI) and a binned Kolmogorov-Smirnov
+statistic (largest gap between the two binned CDFs).
+
+The repository ships no training data, so the reference is built from
+a dataset you supply, typically the training set::
+
+    python -m heart_risk.drift reference training.csv --out drift_reference.json
+    python -m heart_risk.drift check scored.csv --reference drift_reference.json
+
+``check`` accepts raw or scored files (``heart_risk.batch_score`` output);
+a file without a ``risk_probability`` column is scored first.
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from .schema import FEATURE_SPECS
+
+REFERENCE_FILENAME = 'drift_reference.json'
+REFERENCE_PATH = os.environ.get('HEART_RISK_DRIFT_REFERENCE')
+MONITOR_ENABLED = os.environ.get('HEART_RISK_MONITOR', '1') != '0'
+
+RISK_COLUMN = 'risk_probability'
+CONTINUOUS_BINS = 10
+RISK_EDGES = tuple(float(edge) for edge in range(10, 100, 10))  # Risk % deciles
+
+# Conventional PSI reading: < 0.1 stable, < 0.25 moderate shift, else significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+# Fewer observations than this make PSI/KS mostly noise
+MIN_SAMPLES = 100
+
+
+def feature_edges(spec, n_bins=CONTINUOUS_BINS):
+    """Interior bin edges for a feature spec.
+
+    Values beyond the outer edges fall into the first or last bin.
+    """
+    if spec.codes is not None:
+        codes = sorted(spec.codes)
+        return tuple((low + high) / 2 for low, high in zip(codes, codes[1:]))
+    return tuple(np.linspace(spec.minimum, spec.maximum, n_bins + 1)[1:-1].tolist())
+
+
+class DistributionProfile:
+    """Constant-memory histograms of the inputs and predicted risk."""
+
+    def __init__(self, feature_names, edges=None):
+        self.columns = list(feature_names) + [RISK_COLUMN]
+        if edges is None:
+            edges = [feature_edges(FEATURE_SPECS[name]) for name in feature_names]
+            edges.append(RISK_EDGES)
+        self.edges = [tuple(column_edges) for column_edges in edges]
+        self.counts = [np.zeros(len(column_edges) + 1, dtype=np.int64)
+                       for column_edges in self.edges]
+        self.n = 0
+        self._edge_arrays = [np.asarray(column_edges) for column_edges in self.edges]
+        self._lock = threading.Lock()
+
+    def update_one(self, features, risk_prob):
+        """Record one prediction: a bisect and an increment per column."""
+        with self._lock:
+            for counts, column_edges, value in zip(self.counts, self.edges,
+                                                   list(features) + [risk_prob]):
+                counts[bisect.bisect_right(column_edges, value)] += 1
+            self.n += 1
+
+    def update(self, features, risk_prob):
+        """Record a batch of predictions (rows of ``features``, risk in %)."""
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if not len(features):
+            return
+        columns = list(features.T) + [np.asarray(risk_prob, dtype=np.float64)]
+        with self._lock:
+            for counts, column_edges, values in zip(self.counts, self._edge_arrays, columns):
+                bins = np.searchsorted(column_edges, values, side='right')
+                counts += np.bincount(bins, minlength=len(counts))
+            self.n += len(features)
+
+    def reset(self):
+        with self._lock:
+            for counts in self.counts:
+                counts[:] = 0
+            self.n = 0
+
+    def proportions(self, column):
+        counts = self.counts[self.columns.index(column)]
+        return counts / max(counts.sum(), 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'n': self.n,
+                'columns': {
+                    name: {'edges': list(column_edges), 'counts': counts.tolist()}
+                    for name, column_edges, counts in zip(self.columns, self.edges, self.counts)
+                }
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        names = [name for name in data['columns'] if name != RISK_COLUMN]
+        profile = cls(names, edges=[data['columns'][name]['edges']
+                                    for name in names + [RISK_COLUMN]])
+        for counts, name in zip(profile.counts, profile.columns):
+            counts[:] = data['columns'][name]['counts']
+        profile.n = data['n']
+        return profile
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def psi(expected, actual, epsilon=1e-4):
+    """Population stability index between two binned distributions."""
+    expected = np.maximum(np.asarray(expected, dtype=np.float64), epsilon)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def binned_ks(expected, actual):
+    """Largest absolute gap between the cumulative binned distributions."""
+    return float(np.abs(np.cumsum(expected) - np.cumsum(actual)).max())
+
+
+@dataclass(frozen=True)
+class DriftScore:
+    column: str
+    psi: float
+    ks: float
+
+    @property
+    def status(self):
+        if self.psi >= PSI_SIGNIFICANT:
+            return 'significant'
+        if self.psi >= PSI_MODERATE:
+            return 'moderate'
+        return 'stable'
+
+
+def compare(reference, current):
+    """Drift scores of ``current`` against ``reference``, one per shared column."""
+    scores = []
+    for name in current.columns:
+        if name not in reference.columns:
+            continue
+        if reference.edges[reference.columns.index(name)] != current.edges[current.columns.index(name)]:
+            raise ValueError(f"Bins of {name!r} differ between the profiles")
+        expected, actual = reference.proportions(name), current.proportions(name)
+        scores.append(DriftScore(name, psi(expected, actual), binned_ks(expected, actual)))
+    return scores
+
+
+def find_reference(predictor):
+    """Load ``HEART_RISK_DRIFT_REFERENCE`` or ``drift_reference.json`` next
+    to the model files; None when neither exists."""
+    candidates = [REFERENCE_PATH] if REFERENCE_PATH else []
+    if predictor.source_dir:
+        candidates.append(os.path.join(predictor.source_dir, REFERENCE_FILENAME))
+        candidates.append(os.path.join(os.path.dirname(os.path.abspath(predictor.source_dir)),
+                                       REFERENCE_FILENAME))
+    for path in candidates:
+        if os.path.exists(path):
+            return DistributionProfile.load(path)
+    return None
+
+
+def profile_file(path, predictor=None, chunk_size=50_000):
+    """Stream a CSV/Parquet file into a DistributionProfile.
+
+    Files without a ``risk_probability`` column are scored with
+    ``predictor`` (loaded on demand). Rows failing validation are skipped.
+    """
+    from .batch_score import iter_chunks
+    from .schema import FeatureSchema
+
+    profile = schema = None
+    for frame in iter_chunks(path, chunk_size):
+        if profile is None:
+            if predictor is None:
+                from .engine import HeartRiskPredictor
+
+                predictor = HeartRiskPredictor.load(cache=False, monitor=False)
+            schema = FeatureSchema(predictor.feature_names)
+            profile = DistributionProfile(predictor.feature_names)
+
+        validation = schema.validate_frame(frame)
+        valid = validation.valid
+        if RISK_COLUMN in frame.columns:
+            risk = frame[RISK_COLUMN].to_numpy(dtype=np.float64)
+            valid = valid & ~np.isnan(risk)
+            risk = risk[valid]
+        else:
+            risk = predictor.predict_batch(validation.features[valid]).risk_prob
+        profile.update(validation.features[valid], risk)
+    if profile is None:
+        raise ValueError(f"{path} has no rows")
+    return profile
+
+
+def format_scores(scores):
+    lines = [f"{'column':<18} {'PSI':>8} {'KS':>8}  status"]
+    lines += [f"{s.column:<18} {s.psi:8.4f} {s.ks:8.4f}  {s.status}" for s in scores]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.drift',
+                                     description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    reference = commands.add_parser('reference', help='Build a reference profile from a dataset')
+    reference.add_argument('input', help='CSV or Parquet file, raw or scored')
+    reference.add_argument('--out', default=REFERENCE_FILENAME)
+
+    check = commands.add_parser('check', help='Score drift of a dataset against a reference')
+    check.add_argument('input', help='CSV or Parquet file, raw or scored')
+    check.add_argument('--reference', default=REFERENCE_PATH or REFERENCE_FILENAME)
+    check.add_argument('--fail-on', choices=('moderate', 'significant'), default=None,
+                       help='Exit 1 if any column reaches this drift status')
+    check.add_argument('--json', action='store_true', help='Print scores as JSON')
+
+    args = parser.parse_args(argv)
+    if args.command == 'reference':
+        profile = profile_file(args.input)
+        profile.save(args.out)
+        print(f"Wrote reference profile of {profile.n:,} rows to {args.out}")
+        return 0
+
+    scores = compare(DistributionProfile.load(args.reference), profile_file(args.input))
+    if args.json:
+        print(json.dumps([{'column': s.column, 'psi': s.psi, 'ks': s.ks, 'status': s.status}
+                          for s in scores], indent=2))
+    else:
+        print(format_scores(scores))
+    failing = {'moderate': ('moderate', 'significant'), 'significant': ('significant',)}
+    if args.fail_on and any(s.status in failing[args.fail_on] for s in scores):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
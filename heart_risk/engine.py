@@ -0,0 +1,561 @@
+"""Headless prediction engine for the heart disease risk model.
+
+Nothing in this module imports streamlit or plotly, so workers, CLIs and
+benchmarks can load and query the model without paying for the UI stack.
+"""
+import copy
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import metrics
+from .cache import PredictionCache, canonical_key
+from .schema import FeatureSchema
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = {
+    'model': 'heart_disease_model_optimized.pkl',
+    'features': 'feature_names.pkl',
+    'info': 'model_info.pkl'
+}
+
+# Candidate locations for the model files, in search order
+DEFAULT_SEARCH_DIRS = (
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),  # Repository root
+    os.getcwd(),  # Current working directory
+    '/opt/render/project/src',  # Render deployment path
+    '.',  # Current directory
+)
+
+# Inference backends: 'sklearn' calls the forest directly, 'flat' evaluates
+# a FlatForest export of it; HEART_RISK_BACKEND picks the default
+BACKENDS = ('sklearn', 'flat')
+DEFAULT_BACKEND = os.environ.get('HEART_RISK_BACKEND', 'sklearn')
+
+# Above this many rows sklearn's compiled traversal beats the flat
+# NumPy one, so the flat backend hands larger inputs back to the forest
+FLAT_MAX_ROWS = 256
+
+# Entries in the per-predictor LRU cache of single predictions; 0 disables it
+CACHE_SIZE = int(os.environ.get('HEART_RISK_CACHE_SIZE', '4096'))
+
+# Optional precomputed risk table (path without extension, see
+# heart_risk.lookup) consulted before the forest; interpolation only serves
+# off-grid rows in cells the forest is flat over, away from tier boundaries
+LOOKUP_TABLE = os.environ.get('HEART_RISK_LOOKUP_TABLE')
+LOOKUP_INTERPOLATE = os.environ.get('HEART_RISK_LOOKUP_INTERPOLATE', '0') == '1'
+
+# Explicit model bundle directory tried before the search directories
+BUNDLE_PATH = os.environ.get('HEART_RISK_BUNDLE')
+
+# Rows per predict_proba call for batch and streaming prediction
+DEFAULT_CHUNK_SIZE = 5000
+
+RISK_LEVELS = ('low', 'medium', 'high')
+
+# Value ranges of the app's input widgets, in feature order
+WIDGET_DOMAIN = (
+    ('age', np.arange(20, 101)),
+    ('sex', np.array([0, 1])),
+    ('cp', np.array([0, 1, 2, 3])),
+    ('trestbps', np.arange(80, 201)),
+    ('chol', np.arange(100, 401)),
+    ('fbs', np.array([0, 1])),
+    ('restecg', np.array([0, 1, 2])),
+    ('thalach', np.arange(60, 221)),
+    ('exang', np.array([0, 1])),
+    ('oldpeak', np.round(np.arange(0, 61) * 0.1, 1)),
+    ('slope', np.array([0, 1, 2])),
+    ('ca', np.array([0, 1, 2, 3])),
+    ('thal', np.array([1, 3, 6, 7])),
+)
+
+
+class ModelFilesNotFoundError(FileNotFoundError):
+    """Raised when no search directory holds a loadable set of model files."""
+
+    def __init__(self, search_dirs, errors=None):
+        self.search_dirs = list(search_dirs)
+        self.errors = dict(errors or {})
+        super().__init__(
+            "Model files not found in any of: " + ", ".join(self.search_dirs)
+        )
+
+
+def risk_level_for(risk_prob):
+    """Map a risk percentage to the app's low / medium / high tier."""
+    if risk_prob < 30:
+        return 'low'
+    if risk_prob < 70:
+        return 'medium'
+    return 'high'
+
+
+def risk_levels_for(risk_probs):
+    """Vectorized :func:`risk_level_for` over an array of percentages."""
+    risk_probs = np.asarray(risk_probs, dtype=np.float64)
+    return np.select(
+        [risk_probs < 30, risk_probs < 70],
+        ['low', 'medium'],
+        default='high'
+    )
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _default_lookup_table(lookup_table):
+    # None loads HEART_RISK_LOOKUP_TABLE if set, False disables the table
+    if lookup_table is False:
+        return None
+    if lookup_table is None and LOOKUP_TABLE:
+        from .lookup import RiskTable
+
+        return RiskTable.load(LOOKUP_TABLE)
+    return lookup_table
+
+
+def _default_cache():
+    from .shared_cache import SHARED_CACHE_PATH
+
+    local = PredictionCache(CACHE_SIZE) if CACHE_SIZE > 0 else None
+    if not SHARED_CACHE_PATH:
+        return local
+    from .shared_cache import SqliteResultCache, TieredCache
+
+    shared = SqliteResultCache(SHARED_CACHE_PATH)
+    return shared if local is None else TieredCache(local, shared)
+
+
+def _without_feature_names(model, feature_names):
+    """Shallow copy of ``model`` that scores plain arrays without warning.
+
+    The forest was fitted on a DataFrame but is always scored with arrays
+    in ``feature_names`` order. Dropping ``feature_names_in_`` skips
+    sklearn's per-call name check (and its "X does not have valid feature
+    names" warning) once the order has been checked here. The trees are
+    shared with the original, not copied.
+    """
+    if list(model.feature_names_in_) != list(feature_names):
+        raise ValueError(f"Model was fitted on features {list(model.feature_names_in_)}, "
+                         f"not {list(feature_names)}")
+    model = copy.copy(model)
+    del model.feature_names_in_
+    return model
+
+
+def reference_inputs(n_rows=4096, seed=42):
+    """Fixed pseudo-random sample of the widget domain for parity checks."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.choice(values, size=n_rows) for _, values in WIDGET_DOMAIN
+    ]).astype(np.float64)
+
+
+@dataclass(frozen=True)
+class Prediction:
+    label: int
+    probability: float  # Probability of the positive class, 0-1
+    risk_level: str
+
+    @property
+    def risk_prob(self):
+        return self.probability * 100
+
+
+@dataclass(frozen=True)
+class BatchPrediction:
+    labels: np.ndarray
+    probabilities: np.ndarray  # Positive-class probability per row, 0-1
+    risk_levels: np.ndarray
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def risk_prob(self):
+        return self.probabilities * 100
+
+    def __getitem__(self, index):
+        return Prediction(
+            label=int(self.labels[index]),
+            probability=float(self.probabilities[index]),
+            risk_level=str(self.risk_levels[index])
+        )
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({
+            'prediction': self.labels,
+            'risk_probability': np.round(self.risk_prob, 1),
+            'risk_level': self.risk_levels
+        })
+
+
+class HeartRiskPredictor:
+    """Owns the fitted forest, its feature order and the model metadata."""
+
+    def __init__(self, model, feature_names, model_info, source_dir=None,
+                 backend=None, model_hash=None, cache=None, lookup_table=None,
+                 forest=None, feature_importances=None, version=None, monitor=None):
+        if model is None and forest is None:
+            raise ValueError("Either a fitted model or a FlatForest is required")
+        self.feature_names = list(feature_names)
+        if model is not None and hasattr(model, 'feature_names_in_'):
+            model = _without_feature_names(model, self.feature_names)
+        self.model = model
+        self.model_info = dict(model_info)
+        self.source_dir = source_dir
+        self.model_hash = model_hash
+        self.version = version or (model_hash[:12] if model_hash else None)
+        self.load_seconds = None
+        self._feature_importances = feature_importances
+        self._schema = None
+        self.backend = backend or DEFAULT_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend {self.backend!r}; expected one of {', '.join(BACKENDS)}"
+            )
+
+        if self.backend == 'flat':
+            if forest is None:
+                from .flat_forest import FlatForest
+
+                forest = FlatForest.from_sklearn(model)
+            self.forest = forest
+            self._predict_proba = self._flat_predict_proba
+        elif model is None:
+            raise ValueError("The sklearn backend needs the fitted model")
+        else:
+            self.forest = forest
+            self._predict_proba = model.predict_proba
+        self.classes_ = model.classes_ if model is not None else forest.classes_
+
+        # The backend without the lookup table, for parity checks
+        self._forest_predict_proba = self._predict_proba
+        self.lookup_table = lookup_table
+        if lookup_table is not None:
+            if lookup_table.model_hash != model_hash:
+                raise ValueError("Lookup table was built for a different model")
+            forest_predict_proba = self._forest_predict_proba
+            self._predict_proba = lambda features: lookup_table.predict_proba(
+                features, forest_predict_proba, interpolate=LOOKUP_INTERPOLATE
+            )
+
+        # cache=None builds the default LRU cache (in front of the shared
+        # cache when HEART_RISK_SHARED_CACHE is set), cache=False disables it
+        if cache is None:
+            cache = _default_cache()
+        self.cache = None if cache is False else cache
+        if self.cache is not None:
+            self.cache.bind(model_hash)
+
+        # Population seen by predict_one / score_columns, for drift checks;
+        # monitor=None builds one unless HEART_RISK_MONITOR=0, False disables
+        if monitor is None:
+            from .drift import MONITOR_ENABLED, DistributionProfile
+
+            if MONITOR_ENABLED:
+                monitor = DistributionProfile(self.feature_names)
+        self.monitor = None if monitor is False else monitor
+
+    @classmethod
+    def from_directory(cls, directory, backend=None, cache=None, lookup_table=None,
+                       monitor=None):
+        import joblib
+
+        paths = {key: os.path.join(directory, filename)
+                 for key, filename in MODEL_FILES.items()}
+        with metrics.timed('load.joblib'):
+            model = joblib.load(paths['model'])
+            feature_names = joblib.load(paths['features'])
+            model_info = joblib.load(paths['info'])
+        with metrics.timed('load.hash'):
+            model_hash = file_sha256(paths['model'])
+        return cls(model, feature_names, model_info, source_dir=directory,
+                   backend=backend, model_hash=model_hash,
+                   cache=cache, lookup_table=_default_lookup_table(lookup_table),
+                   monitor=monitor)
+
+    @classmethod
+    def from_bundle(cls, bundle_dir, backend=None, cache=None, lookup_table=None,
+                    verify=True, monitor=None):
+        """Load from a bundle written by :mod:`heart_risk.bundle`.
+
+        Bundles default to the flat backend, which serves straight from the
+        memory-mapped arrays; the sklearn pickle is only read for
+        ``backend='sklearn'``.
+        """
+        from .bundle import load_bundle
+
+        backend = backend or os.environ.get('HEART_RISK_BACKEND', 'flat')
+        with metrics.timed('load.bundle'):
+            forest, model, manifest = load_bundle(bundle_dir, verify=verify,
+                                                  load_model=backend == 'sklearn')
+        return cls(model, manifest['feature_names'], manifest['model_info'],
+                   source_dir=bundle_dir, backend=backend,
+                   model_hash=manifest['model_hash'], cache=cache,
+                   lookup_table=_default_lookup_table(lookup_table), forest=forest,
+                   feature_importances=manifest.get('feature_importances'),
+                   version=manifest['version'], monitor=monitor)
+
+    @classmethod
+    def load(cls, search_dirs=DEFAULT_SEARCH_DIRS, prefer_bundle=True, **options):
+        """Load from ``HEART_RISK_BUNDLE`` or the first search directory that
+        holds a model bundle or all three pickled model files.
+
+        ``options`` are passed through to :meth:`from_bundle` or
+        :meth:`from_directory`. The wall time is kept in ``load_seconds``.
+        A ``HEART_RISK_BUNDLE`` that is missing or fails to load raises;
+        discovered locations that fail are logged and skipped.
+        """
+        from .bundle import BUNDLE_DIRNAME, is_bundle
+
+        started = time.perf_counter()
+        candidates = []
+        if prefer_bundle:
+            if BUNDLE_PATH:
+                candidates.append((BUNDLE_PATH, cls.from_bundle, True))
+            candidates.extend((os.path.join(directory, BUNDLE_DIRNAME), cls.from_bundle, False)
+                              for directory in search_dirs)
+        candidates.extend((directory, cls.from_directory, False) for directory in search_dirs)
+
+        errors = {}
+        for directory, loader, explicit in candidates:
+            with metrics.timed('load.probe'):
+                if loader == cls.from_bundle:
+                    found = is_bundle(directory)
+                else:
+                    found = all(os.path.exists(os.path.join(directory, filename))
+                                for filename in MODEL_FILES.values())
+            if not found:
+                if explicit:
+                    raise ModelFilesNotFoundError([directory])
+                continue
+            try:
+                predictor = loader(directory, **options)
+            except Exception as e:
+                metrics.increment('model_load_errors')
+                # A configured bundle (integrity failure, compact bundle
+                # without the pickle for sklearn) must not be swapped for
+                # whatever else is on disk
+                if explicit:
+                    raise
+                logger.warning("Could not load the model from %s: %s", directory, e)
+                errors[directory] = e  # Try next directory
+                continue
+            predictor.load_seconds = time.perf_counter() - started
+            metrics.observe('load', predictor.load_seconds)
+            metrics.set_gauge('model_load_seconds', round(predictor.load_seconds, 6))
+            return predictor
+        raise ModelFilesNotFoundError(search_dirs, errors)
+
+    @property
+    def model_type(self):
+        return self.model_info.get('model_type', type(self.model).__name__)
+
+    @property
+    def feature_importances_(self):
+        if self.model is not None:
+            return self.model.feature_importances_
+        if self._feature_importances is None:
+            return None
+        return np.asarray(self._feature_importances)
+
+    @property
+    def total_features(self):
+        return self.model_info.get('total_features', len(self.feature_names))
+
+    @property
+    def schema(self):
+        """:class:`FeatureSchema` for this model's feature order."""
+        if self._schema is None:
+            self._schema = FeatureSchema(self.feature_names)
+        return self._schema
+
+    def _flat_predict_proba(self, features):
+        if len(features) > FLAT_MAX_ROWS and self.model is not None:
+            return self.model.predict_proba(features)
+        return self.forest.predict_proba(features)
+
+    def as_features(self, X):
+        """Return ``X`` as a 2D float array in the model's feature order."""
+        if hasattr(X, 'columns'):
+            X = X[self.feature_names].to_numpy(dtype=np.float64)
+        features = np.asarray(X, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != len(self.feature_names):
+            raise ValueError(
+                f"Expected {len(self.feature_names)} features, got {features.shape[1]}"
+            )
+        return features
+
+    def _record_features(self, record):
+        if isinstance(record, dict):
+            return [record[name] for name in self.feature_names]
+        return record
+
+    def records_to_features(self, records):
+        """Feature matrix from records given as mappings or sequences."""
+        return self.as_features([self._record_features(record) for record in records])
+
+    def validate_records(self, records):
+        """Validate records given as mappings or sequences; see
+        :meth:`FeatureSchema.validate`. A mapping missing a feature raises
+        KeyError."""
+        return self.schema.validate_array([self._record_features(record) for record in records])
+
+    def predict_proba(self, X):
+        return self._predict_proba(self.as_features(X))
+
+    def _batch_from_proba(self, probabilities):
+        # Same label rule as RandomForestClassifier.predict, so the forest
+        # only needs to be traversed once per row
+        return BatchPrediction(
+            labels=self.classes_.take(probabilities.argmax(axis=1)),
+            probabilities=probabilities[:, 1],
+            risk_levels=risk_levels_for(probabilities[:, 1] * 100)
+        )
+
+    def predict_one(self, record):
+        """Score a single patient given as a sequence or a feature mapping.
+
+        Results are memoized in the predictor's LRU cache, if it has one.
+        """
+        with metrics.timed('features'):
+            features = self.as_features(self._record_features(record))
+        metrics.increment('predictions')
+        if self.cache is None:
+            return self._predict_one_uncached(features)
+
+        key = canonical_key(features)
+        prediction = self.cache.get(key)
+        if prediction is None:
+            metrics.increment('cache_misses')
+            prediction = self._predict_one_uncached(features)
+            self.cache.put(key, prediction)
+        else:
+            metrics.increment('cache_hits')
+            if self.monitor is not None:
+                self.monitor.update_one(key, prediction.risk_prob)
+        return prediction
+
+    def _predict_one_uncached(self, features):
+        with metrics.timed('predict_proba'):
+            probabilities = self._predict_proba(features)
+        prediction = self._batch_from_proba(probabilities)[0]
+        if self.monitor is not None:
+            self.monitor.update_one(features[0].tolist(), prediction.risk_prob)
+        return prediction
+
+    def predict_batch(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Score an array or DataFrame in vectorized chunks."""
+        features = self.as_features(X)
+        probabilities = np.empty((len(features), len(self.classes_)), dtype=np.float64)
+        with metrics.timed('predict_batch'):
+            for start in range(0, len(features), chunk_size):
+                chunk = features[start:start + chunk_size]
+                probabilities[start:start + len(chunk)] = self._predict_proba(chunk)
+        metrics.increment('batch_rows_scored', len(features))
+        return self._batch_from_proba(probabilities)
+
+    def _require_model(self):
+        if self.model is None:
+            raise RuntimeError("Parity checks need the sklearn model; load it "
+                               "from pickles or with backend='sklearn'")
+
+    def score_columns(self, frame, explain=False):
+        """Result columns for every row of a DataFrame of raw records.
+
+        Rows that fail schema validation get prediction -1, a NaN
+        probability, risk level 'invalid' and the reason in
+        ``validation_error`` instead of failing the whole frame. With
+        ``explain`` a ``contribution_<feature>`` column per feature holds
+        the :mod:`heart_risk.explain` contributions in percentage points.
+        """
+        validation = self.schema.validate_frame(frame)
+        features, valid = validation.features, validation.valid
+        prediction = np.full(len(features), -1)
+        risk_prob = np.full(len(features), np.nan)
+        risk_level = np.full(len(features), 'invalid', dtype=object)
+        if valid.any():
+            batch = self.predict_batch(features[valid])
+            prediction[valid] = batch.labels
+            risk_prob[valid] = batch.risk_prob
+            risk_level[valid] = batch.risk_levels
+            if self.monitor is not None:
+                self.monitor.update(features[valid], batch.risk_prob)
+        columns = {
+            'prediction': prediction,
+            'risk_probability': np.round(risk_prob, 1),
+            'risk_level': risk_level,
+            'validation_error': validation.errors
+        }
+        if explain:
+            from .explain import explain as explain_rows
+
+            contributions = np.full(features.shape, np.nan)
+            if valid.any():
+                contributions[valid] = explain_rows(self, features[valid]).contributions
+            for j, name in enumerate(self.feature_names):
+                columns['contribution_' + name] = np.round(contributions[:, j], 2)
+        return columns
+
+    def score_frame(self, frame, explain=False):
+        """Copy of ``frame`` with the :meth:`score_columns` results appended."""
+        results = frame.copy()
+        for name, values in self.score_columns(frame, explain=explain).items():
+            results[name] = values
+        return results
+
+    def verify_label_parity(self, X=None):
+        """Return the number of rows where the single-pass label differs
+        from ``model.predict``; zero means the two paths agree."""
+        self._require_model()
+        features = reference_inputs() if X is None else self.as_features(X)
+        expected = self.model.predict(features)
+        return int(np.count_nonzero(self.predict_batch(features).labels != expected))
+
+    def max_proba_deviation(self, X=None):
+        """Largest absolute difference between the active backend's
+        probabilities and ``model.predict_proba``. A lookup table is not
+        consulted; its own bound is :attr:`RiskTable.max_error`."""
+        self._require_model()
+        features = reference_inputs() if X is None else self.as_features(X)
+        expected = self.model.predict_proba(features)
+        actual = np.concatenate([
+            self._forest_predict_proba(features[start:start + FLAT_MAX_ROWS])
+            for start in range(0, len(features), FLAT_MAX_ROWS)
+        ])
+        return float(np.abs(actual - expected).max())
+
+    def predict_iter(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Lazily score an iterable of records, yielding one Prediction each.
+
+        Records are buffered into chunks so the forest still runs vectorized.
+        """
+        buffer = []
+        for record in stream:
+            buffer.append(self._record_features(record))
+            if len(buffer) >= chunk_size:
+                yield from self._iter_batch(buffer)
+                buffer = []
+        if buffer:
+            yield from self._iter_batch(buffer)
+
+    def _iter_batch(self, records):
+        batch = self.predict_batch(records)
+        for index in range(len(batch)):
+            yield batch[index]
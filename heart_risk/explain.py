@@ -0,0 +1,65 @@
+"""Per-prediction feature contributions for the forest.
+
+Contributions come from :meth:`FlatForest.decompose`: each split along a
+row's path in each tree credits the change in positive-class probability
+to the split feature, so ``bias + contributions.sum()`` is exactly the
+forest's risk. The decomposition rides along with the vectorized
+traversal, costing about 1.4x a flat-backend prediction per row.
+
+Explanations always describe the forest, even when a lookup table
+serves the predictor's probabilities.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import metrics
+from .engine import DEFAULT_CHUNK_SIZE
+
+
+@dataclass(frozen=True)
+class Explanation:
+    feature_names: list
+    bias: float  # Root-node risk averaged over trees, in %
+    contributions: np.ndarray  # (n_rows, n_features), percentage points
+
+    @property
+    def risk_prob(self):
+        return self.bias + self.contributions.sum(axis=1)
+
+    def top(self, row=0, n=None):
+        """``(feature, contribution)`` pairs of one row, largest magnitude first."""
+        order = np.argsort(-np.abs(self.contributions[row]))[:n]
+        return [(self.feature_names[j], float(self.contributions[row, j])) for j in order]
+
+    def to_frame(self, prefix='contribution_'):
+        import pandas as pd
+
+        return pd.DataFrame(np.round(self.contributions, 2),
+                            columns=[prefix + name for name in self.feature_names])
+
+
+def flat_forest(predictor):
+    """The predictor's FlatForest, exported from the sklearn model on first use."""
+    if predictor.forest is None:
+        from .flat_forest import FlatForest
+
+        predictor.forest = FlatForest.from_sklearn(predictor.model)
+    return predictor.forest
+
+
+def explain(predictor, X, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Feature contributions, in risk percentage points, for every row of ``X``."""
+    features = predictor.as_features(X)
+    forest = flat_forest(predictor)
+    positive = int(np.flatnonzero(np.asarray(forest.classes_) == 1)[0])
+    contributions = np.empty(features.shape, dtype=np.float64)
+    bias = 0.0
+    with metrics.timed('explain'):
+        for start in range(0, len(features), chunk_size):
+            chunk = features[start:start + chunk_size]
+            bias, contributions[start:start + len(chunk)] = forest.decompose(
+                chunk, class_index=positive
+            )
+    return Explanation(feature_names=predictor.feature_names, bias=bias * 100,
+                       contributions=contributions * 100)
@@ -0,0 +1,174 @@
+"""Export the model to the portable format run by :mod:`heart_risk.portable`.
+
+The export is one ``.npz`` holding the flattened forest, the feature order
+from ``feature_names.pkl`` and the model metadata. Serving it needs only
+NumPy and the standalone ``portable.py``, not scikit-learn or joblib.
+
+Split thresholds are stored as float32, rounded down so every split
+decision is unchanged (see :mod:`heart_risk.compact`). Node values are
+stored as float32 positive-class probabilities. Each export is checked
+against ``model.predict_proba`` on the reference inputs. The measured
+deviation is written into the file's metadata, and the export is refused
+above ``PARITY_TOLERANCE``.
+
+Usage::
+
+    python -m heart_risk.export build [--source DIR] [--out heart_risk_model.npz]
+    python -m heart_risk.export verify heart_risk_model.npz [--source DIR]
+    python -m heart_risk.export coldstart heart_risk_model.npz [--source DIR]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from .coldstart import COLD_START_PROFILE, measure
+from .compact import _float32_floor
+from .engine import MODEL_FILES, reference_inputs
+from .portable import FORMAT_VERSION, PortableModel
+
+DEFAULT_OUT = 'heart_risk_model.npz'
+
+# float32 node values put the averaged probability within ~1e-7 of sklearn
+PARITY_TOLERANCE = 1e-6
+
+
+class ParityError(ValueError):
+    """Raised when an exported model does not reproduce ``model.predict_proba``."""
+
+
+def check_parity(portable, model, X=None):
+    """Return ``(max |dp|, label mismatches)`` of ``portable`` against the
+    sklearn ``model`` on ``X`` (default: the reference inputs)."""
+    X = reference_inputs() if X is None else np.asarray(X, dtype=np.float64)
+    expected = model.predict_proba(X)
+    actual = portable.predict_proba(X)
+    mismatches = int(np.count_nonzero(portable.predict(X) != model.predict(X)))
+    return float(np.abs(actual - expected).max()), mismatches
+
+
+def export_portable(predictor, path):
+    """Write ``predictor`` (loaded from pickles) to ``path``; returns the
+    metadata, including the parity measured on the reference inputs."""
+    from .flat_forest import FlatForest
+
+    if predictor.model is None:
+        raise ValueError("Exporting needs the sklearn model")
+    if len(predictor.classes_) != 2:
+        raise ValueError("The portable format stores binary classifiers only")
+    forest = predictor.forest or FlatForest.from_sklearn(predictor.model)
+
+    index_dtype = np.int16 if forest.node_count <= np.iinfo(np.int16).max else np.int32
+    arrays = {
+        'feature': np.asarray(forest.feature).astype(np.int8 if forest.n_features <= 127
+                                                     else np.int16),
+        'threshold': _float32_floor(forest.threshold),
+        'left': np.asarray(forest.children_left).astype(index_dtype),
+        'right': np.asarray(forest.children_right).astype(index_dtype),
+        'value': np.asarray(forest.value)[:, 1].astype(np.float32),
+        'roots': np.asarray(forest.roots).astype(index_dtype),
+    }
+    metadata = {
+        'format_version': FORMAT_VERSION,
+        'feature_names': predictor.feature_names,
+        'classes': predictor.classes_.tolist(),
+        'max_depth': forest.max_depth,
+        'model_hash': predictor.model_hash,
+        'model_info': {key: value.item() if isinstance(value, np.generic) else value
+                       for key, value in predictor.model_info.items()},
+    }
+
+    max_deviation, mismatches = check_parity(PortableModel(metadata=metadata, **arrays),
+                                             predictor.model)
+    if max_deviation > PARITY_TOLERANCE or mismatches:
+        raise ParityError(f"Export deviates from the sklearn model: max |dp| "
+                          f"{max_deviation:.3g}, {mismatches} label mismatches")
+    metadata['parity'] = {'rows': len(reference_inputs()), 'max_abs_dp': max_deviation,
+                          'label_mismatches': mismatches}
+
+    with open(path, 'wb') as f:
+        np.savez(f, metadata=np.array(json.dumps(metadata, default=str)), **arrays)
+    return metadata
+
+
+def measure_cold_start(model_path, source_dir, repeat=3):
+    """Time import + load + first prediction in fresh interpreters for the
+    portable runtime and for joblib + sklearn.
+
+    Returns ``{variant: (best seconds, peak RSS in KB)}``.
+    """
+    # The runtime is copied alone into an empty directory, as it is deployed
+    runtime_dir = tempfile.mkdtemp()
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'portable.py'),
+                runtime_dir)
+    pickle_path = os.path.join(source_dir, MODEL_FILES['model'])
+    variants = {
+        'portable (numpy)': (f"sys.path.insert(0, {runtime_dir!r})\n"
+                             f"from portable import PortableModel\n"
+                             f"predict_proba = PortableModel.load({model_path!r}).predict_proba"),
+        'pickle (sklearn)': (f"import joblib\n"
+                             f"predict_proba = joblib.load({pickle_path!r}).predict_proba"),
+    }
+    try:
+        return {name: measure(f"{load}\npredict_proba([{COLD_START_PROFILE!r}])", repeat,
+                              cwd=runtime_dir)
+                for name, load in variants.items()}
+    finally:
+        shutil.rmtree(runtime_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.export',
+                                     description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Export the pickled model')
+    build.add_argument('--out', default=DEFAULT_OUT)
+
+    verify = commands.add_parser('verify', help='Re-check parity against the pickled model')
+    verify.add_argument('path', nargs='?', default=DEFAULT_OUT)
+
+    coldstart = commands.add_parser('coldstart', help='Compare cold start with sklearn')
+    coldstart.add_argument('path', nargs='?', default=DEFAULT_OUT)
+    coldstart.add_argument('--repeat', type=int, default=3)
+
+    for command in (build, verify, coldstart):
+        command.add_argument('--source', default=None, help='Directory with the .pkl files')
+
+    args = parser.parse_args(argv)
+    from .engine import HeartRiskPredictor
+
+    if args.source:
+        predictor = HeartRiskPredictor.from_directory(args.source, backend='sklearn',
+                                                      cache=False, monitor=False)
+    else:
+        predictor = HeartRiskPredictor.load(backend='sklearn', prefer_bundle=False,
+                                            cache=False, monitor=False)
+
+    if args.command == 'build':
+        metadata = export_portable(predictor, args.out)
+        parity = metadata['parity']
+        print(f"Wrote {args.out} ({os.path.getsize(args.out) / 1e3:.0f} KB); parity on "
+              f"{parity['rows']} rows: max |dp| {parity['max_abs_dp']:.2g}, "
+              f"{parity['label_mismatches']} label mismatches")
+    elif args.command == 'verify':
+        portable = PortableModel.load(args.path)
+        if portable.model_hash != predictor.model_hash:
+            sys.exit(f"{args.path} was exported from a different model")
+        max_deviation, mismatches = check_parity(portable, predictor.model)
+        print(f"max |dp| {max_deviation:.2g}, {mismatches} label mismatches")
+        if max_deviation > PARITY_TOLERANCE or mismatches:
+            sys.exit(1)
+    else:
+        for name, (seconds, rss_kb) in measure_cold_start(os.path.abspath(args.path),
+                                                          predictor.source_dir,
+                                                          args.repeat).items():
+            print(f"{name:<18} {seconds * 1000:8.1f} ms   peak RSS {rss_kb / 1024:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Flattened tree-ensemble inference for the RandomForest model.
+
+All trees of a fitted forest are exported into contiguous NumPy arrays
+(one row per node across the whole ensemble) and evaluated for every tree
+at once with a fixed number of vectorized gather steps. This avoids
+sklearn's per-call input validation and per-estimator joblib dispatch,
+which dominate latency for single-row inputs.
+
+Only NumPy is needed at inference time.
+"""
+import json
+import os
+
+import numpy as np
+
+# Node arrays written by FlatForest.save, one .npy file each
+ARRAY_NAMES = ('feature', 'threshold', 'children_left', 'children_right', 'value', 'roots')
+
+
+class FlatForest:
+    """A forest of axis-aligned decision trees stored as flat node arrays.
+
+    Leaves point to themselves through both children, so every row can be
+    advanced ``max_depth`` times without branching on leaf status.
+    """
+
+    def __init__(self, feature, threshold, children_left, children_right,
+                 value, roots, classes, n_features, max_depth):
+        self.feature = np.ascontiguousarray(feature)
+        self.threshold = np.ascontiguousarray(threshold)
+        self.children_left = np.ascontiguousarray(children_left)
+        self.children_right = np.ascontiguousarray(children_right)
+        self.value = np.ascontiguousarray(value)
+        self.roots = np.ascontiguousarray(roots)
+        self.classes_ = np.asarray(classes)
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Export a fitted RandomForestClassifier (or any list of trees)."""
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+
+        feature, threshold, left, right, value = [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+            left.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            right.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+
+            # Per-node class distribution, normalized the way
+            # DecisionTreeClassifier.predict_proba does
+            node_value = tree.value[:, 0, :]
+            totals = node_value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1
+            value.append(node_value / totals)
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.intp),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            children_left=np.concatenate(left).astype(np.intp),
+            children_right=np.concatenate(right).astype(np.intp),
+            value=np.concatenate(value).astype(np.float64),
+            roots=offsets[:-1].astype(np.intp),
+            classes=model.classes_,
+            n_features=model.n_features_in_,
+            max_depth=max(tree.max_depth for tree in trees)
+        )
+
+    def save(self, directory):
+        """Write one ``.npy`` per node array plus ``forest.json``; returns
+        the paths written.
+
+        Each file is written under a temporary name and renamed over the
+        old one. A process that memory-mapped the old arrays keeps its
+        own inode instead of seeing the file truncated under it.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name in ARRAY_NAMES:
+            path = os.path.join(directory, name + '.npy')
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, getattr(self, name))
+            os.replace(path + '.tmp', path)
+            paths.append(path)
+        path = os.path.join(directory, 'forest.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({
+                'classes': self.classes_.tolist(),
+                'n_features': self.n_features,
+                'max_depth': self.max_depth
+            }, f, indent=2)
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+        return paths
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Load arrays written by :meth:`save`.
+
+        With the default read-only ``mmap_mode`` the node arrays stay
+        backed by the page cache, so every process on a host that loads
+        the same files shares one physical copy.
+        """
+        with open(os.path.join(directory, 'forest.json')) as f:
+            metadata = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in ARRAY_NAMES}
+        return cls(classes=metadata['classes'], n_features=metadata['n_features'],
+                   max_depth=metadata['max_depth'], **arrays)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    def apply(self, X):
+        """Return the global leaf index reached in every tree, shape (n, n_trees)."""
+        # Trees compare float32 inputs against their thresholds, as in sklearn
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_estimators))
+        for _ in range(self.max_depth):
+            values = np.take_along_axis(X, self.feature[nodes], axis=1)
+            nodes = np.where(values <= self.threshold[nodes],
+                             self.children_left[nodes],
+                             self.children_right[nodes])
+        return nodes
+
+    def decompose(self, X, class_index=1):
+        """Path-based (Saabas) decomposition of the ``class_index`` probability.
+
+        Every split on a row's path moves the node value from parent to
+        child; the change is credited to the parent's split feature and
+        averaged over trees. Returns ``(bias, contributions)`` with
+        ``bias + contributions.sum(axis=1)`` equal to the forest's
+        probability for every row. Costs one extra gather and bincount per
+        depth step over :meth:`apply`.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows = X.shape[0]
+        value = self.value[:, class_index]
+        # Row offsets turn (row, feature) pairs into flat bincount bins
+        offsets = (np.arange(n_rows) * self.n_features)[:, None]
+        contributions = np.zeros(n_rows * self.n_features)
+
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_estimators))
+        for _ in range(self.max_depth):
+            features = self.feature[nodes]
+            values = np.take_along_axis(X, features, axis=1)
+            children = np.where(values <= self.threshold[nodes],
+                                self.children_left[nodes],
+                                self.children_right[nodes])
+            # Leaves point to themselves, so finished paths add zero
+            delta = value[children] - value[nodes]
+            contributions += np.bincount((offsets + features).ravel(), weights=delta.ravel(),
+                                         minlength=contributions.size)
+            nodes = children
+
+        bias = float(value[self.roots].mean())
+        return bias, contributions.reshape(n_rows, self.n_features) / self.n_estimators
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # Accumulate in float64 even when the values are stored compactly
+        return self.value[leaves].sum(axis=1, dtype=np.float64) / self.n_estimators
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
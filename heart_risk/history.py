@@ -0,0 +1,170 @@
+"""Opt-in, append-only log of served predictions.
+
+Records are queued by the caller and written by a background thread in
+``executemany`` transactions, so logging never blocks the UI thread on
+disk I/O. The writer commits as soon as its queue is empty; rows that
+arrive while a commit is in progress go into the next batch. Under
+load, batches grow on their own, and a lone prediction is visible
+within one commit. Storage is one SQLite table (WAL mode) with indexes
+on time, on (risk level, time) and on (session, time). Time-range, tier
+and session queries therefore stay index range scans as the log grows
+to millions of rows.
+
+Enable it by pointing ``HEART_RISK_PREDICTION_LOG`` at a database file.
+"""
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+LOG_PATH = os.environ.get('HEART_RISK_PREDICTION_LOG')
+
+DEFAULT_BATCH_SIZE = 256
+
+_STOP = object()
+
+
+class PredictionLog:
+    """SQLite prediction log with a background batched writer."""
+
+    def __init__(self, path, feature_names, batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.feature_names = list(feature_names)
+        self.batch_size = batch_size
+        self.columns = (['ts', 'session_id'] + self.feature_names +
+                        ['label', 'probability', 'risk_level', 'model_hash', 'latency_ms'])
+        self._insert = (f"INSERT INTO predictions ({', '.join(self.columns)}) "
+                        f"VALUES ({', '.join('?' * len(self.columns))})")
+        self._queue = queue.SimpleQueue()
+        self._flushed = threading.Condition()
+        self._pending = 0
+
+        with closing(self._connect()) as connection:
+            self._create_schema(connection)
+        self._writer = threading.Thread(target=self._run, name='heart-risk-prediction-log',
+                                        daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _create_schema(self, connection):
+        features = ', '.join(f'{name} REAL' for name in self.feature_names)
+        connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL,
+                session_id TEXT,
+                {features},
+                label INTEGER,
+                probability REAL,
+                risk_level TEXT,
+                model_hash TEXT,
+                latency_ms REAL
+            );
+            CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts, risk_level);
+            CREATE INDEX IF NOT EXISTS predictions_level_ts ON predictions (risk_level, ts);
+            CREATE INDEX IF NOT EXISTS predictions_session_ts ON predictions (session_id, ts);
+        """)
+
+    def record(self, features, prediction, model_hash=None, latency_ms=None,
+               session_id=None, ts=None):
+        """Queue one prediction for writing; returns immediately."""
+        row = ((ts or time.time(), session_id) + tuple(float(value) for value in features) +
+               (prediction.label, prediction.probability, prediction.risk_level,
+                model_hash, latency_ms))
+        with self._flushed:
+            self._pending += 1
+        self._queue.put(row)
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            item = self._queue.get()
+            rows = []
+            # Take whatever is already queued, then commit without waiting for more
+            while item is not _STOP:
+                rows.append(item)
+                if len(rows) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if rows:
+                try:
+                    with connection:
+                        connection.executemany(self._insert, rows)
+                except sqlite3.Error:
+                    logger.exception("Dropped %d prediction log rows", len(rows))
+                with self._flushed:
+                    self._pending -= len(rows)
+                    self._flushed.notify_all()
+            if item is _STOP:
+                connection.close()
+                return
+
+    def flush(self, timeout=None):
+        """Block until every queued record has been written."""
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+    def _where(self, start=None, end=None, risk_levels=None, session_id=None):
+        clauses, params = [], []
+        if risk_levels:
+            clauses.append(f"risk_level IN ({', '.join('?' * len(risk_levels))})")
+            params.extend(risk_levels)
+        if start is not None:
+            clauses.append('ts >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('ts < ?')
+            params.append(end)
+        if session_id is not None:
+            clauses.append('session_id = ?')
+            params.append(session_id)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def query(self, start=None, end=None, risk_levels=None, session_id=None, limit=1000):
+        """Most recent predictions first, as a DataFrame with a datetime ``time`` column."""
+        import pandas as pd
+
+        where, params = self._where(start, end, risk_levels, session_id)
+        with closing(self._connect()) as connection:
+            frame = pd.read_sql_query(
+                f"SELECT {', '.join(self.columns)} FROM predictions{where} "
+                f"ORDER BY ts DESC LIMIT ?", connection, params=params + [limit]
+            )
+        frame.insert(0, 'time', pd.to_datetime(frame.pop('ts'), unit='s'))
+        return frame
+
+    def counts(self, start=None, end=None, session_id=None):
+        """Number of logged predictions per risk level."""
+        where, params = self._where(start, end, None, session_id)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT risk_level, COUNT(*) FROM predictions{where} GROUP BY risk_level", params
+            ).fetchall()
+        return dict(rows)
+
+
+def open_log(feature_names, path=LOG_PATH):
+    """The PredictionLog at ``path`` (``HEART_RISK_PREDICTION_LOG``), or None."""
+    if not path:
+        return None
+    return PredictionLog(path, feature_names)
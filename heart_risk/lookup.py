@@ -0,0 +1,355 @@
+"""Precomputed risk lookup table over a discrete sub-grid of the input space.
+
+The categorical features are enumerated in full and the continuous ones
+are binned on a configurable step. Risk for every grid cell is computed
+offline and stored as a memory-mapped ``.npy`` array (uint8 or float16)
+next to a JSON sidecar with the axes and the hash of the model that built
+it. Worker processes that map the same file share its pages.
+
+uint8 cells hold the number of trees voting positive, which is exact for
+a forest of pure leaves and up to 254 trees; larger forests are scaled to
+254. Any cell whose stored value would land on a different risk tier or
+label than the forest's is stored as missing and scored by the forest, so
+grid hits always agree with the forest on both. The largest remaining
+probability error is recorded as ``max_error`` in the sidecar.
+
+Lookups are O(1) per row. Rows off the grid are left to the exact
+forest, or with ``HEART_RISK_LOOKUP_INTERPOLATE=1`` interpolated
+multilinearly over the continuous axes. The forest is piecewise
+constant, and on the default steps one cell spans up to 40 points of
+risk. So an interpolated value is only served when every corner of its
+cell holds the same risk (``MAX_INTERPOLATION_SPREAD``) and the value is
+at least ``TIER_MARGIN`` from a tier boundary or 0.5. Every other row is scored
+by the forest. On the default grid that interpolates well under 1% of
+random off-grid rows and never changed a risk tier or label in testing.
+Interpolation saves little unless the table was built with fine steps.
+
+Usage::
+
+    python -m heart_risk.lookup build risk_table --step age=10 --step chol=25
+    python -m heart_risk.lookup info risk_table
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from .engine import WIDGET_DOMAIN, risk_levels_for
+
+CATEGORICAL_FEATURES = ('sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal')
+
+# Default bin step of each continuous feature over its widget range
+DEFAULT_STEPS = {
+    'age': 20,
+    'trestbps': 40,
+    'chol': 100,
+    'thalach': 40,
+    'oldpeak': 2.0,
+}
+
+# Largest probability range across an off-grid row's cell corners for which
+# the interpolated value is served; wider cells are scored by the forest
+MAX_INTERPOLATION_SPREAD = 0.0
+
+# Interpolated values closer than this to a decision boundary are also
+# scored by the forest, which can vary between a cell's corners
+TIER_MARGIN = 0.05
+# The tier cut-offs of engine.risk_level_for and the label's 0.5
+DECISION_BOUNDARIES = (0.30, 0.50, 0.70)
+
+# uint8 value of a cell left to the forest; float16 tables use NaN
+MISSING_UINT8 = 255
+
+DTYPES = ('uint8', 'float16')
+BUILD_CHUNK_ROWS = 200_000
+
+
+def grid_axes(steps=None):
+    """Axis values per feature, in feature order, for the given bin steps."""
+    steps = dict(DEFAULT_STEPS, **(steps or {}))
+    axes = []
+    for name, values in WIDGET_DOMAIN:
+        if name in CATEGORICAL_FEATURES:
+            axes.append((name, values.astype(np.float64)))
+        else:
+            low, high = float(values[0]), float(values[-1])
+            axis = np.round(np.arange(low, high + 1e-9, steps[name]), 1)
+            if axis[-1] < high:
+                axis = np.append(axis, high)
+            axes.append((name, axis))
+    return axes
+
+
+def _boundary_distance(probabilities):
+    return np.min([np.abs(probabilities - boundary) for boundary in DECISION_BOUNDARIES], axis=0)
+
+
+def _decisions(probabilities):
+    # Label as argmax with ties to class 0, as RandomForestClassifier.predict
+    return risk_levels_for(probabilities * 100), probabilities > 0.5
+
+
+def _table_scale(predictor, dtype):
+    if dtype != 'uint8':
+        return 1.0
+    forest = predictor.forest
+    n_trees = forest.n_estimators if forest is not None else len(predictor.model.estimators_)
+    return float(min(n_trees, MISSING_UINT8 - 1))
+
+
+def _missing(cells):
+    cells = np.asarray(cells)
+    if cells.dtype == np.uint8:
+        return cells == MISSING_UINT8
+    return np.isnan(cells)
+
+
+def _encode(probabilities, dtype, scale):
+    """Stored cells and their decoded probabilities; cells that would change
+    tier or label are stored as missing."""
+    if dtype == 'uint8':
+        cells = np.rint(probabilities * scale).astype(np.uint8)
+        decoded = cells / scale
+    else:
+        cells = probabilities.astype(np.float16)
+        decoded = cells.astype(np.float64)
+    (tiers, labels), (exact_tiers, exact_labels) = _decisions(decoded), _decisions(probabilities)
+    changed = (tiers != exact_tiers) | (labels != exact_labels)
+    cells[changed] = MISSING_UINT8 if dtype == 'uint8' else np.nan
+    return cells, np.where(changed, probabilities, decoded)
+
+
+def build_table(predictor, path, steps=None, dtype='uint8', progress=None):
+    """Score every grid cell and write ``<path>.npy`` plus ``<path>.json``."""
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+    axes = grid_axes(steps)
+    scale = _table_scale(predictor, dtype)
+    shape = tuple(len(values) for _, values in axes)
+    table = np.lib.format.open_memmap(path + '.npy', mode='w+',
+                                      dtype=dtype, shape=shape)
+    flat = table.reshape(-1)
+    total = flat.size
+
+    started = time.perf_counter()
+    max_error = 0.0
+    missing = 0
+    for start in range(0, total, BUILD_CHUNK_ROWS):
+        stop = min(start + BUILD_CHUNK_ROWS, total)
+        index = np.unravel_index(np.arange(start, stop), shape)
+        rows = np.column_stack([values[i] for (_, values), i in zip(axes, index)])
+        probabilities = predictor.predict_proba(rows)[:, 1]
+        cells, decoded = _encode(probabilities, dtype, scale)
+        flat[start:stop] = cells
+        max_error = max(max_error, float(np.abs(decoded - probabilities).max()))
+        missing += int(np.count_nonzero(_missing(cells)))
+        if progress is not None:
+            progress(stop, total)
+    table.flush()
+    del table
+
+    metadata = {
+        'feature_names': [name for name, _ in axes],
+        'axes': [values.tolist() for _, values in axes],
+        'dtype': dtype,
+        'model_hash': predictor.model_hash,
+        'scale': scale,
+        'cells': int(total),
+        'missing_cells': missing,
+        'max_error': max_error,
+        'build_seconds': round(time.perf_counter() - started, 3)
+    }
+    with open(path + '.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return RiskTable.load(path)
+
+
+class RiskTable:
+    """Memory-mapped grid of positive-class probabilities."""
+
+    def __init__(self, table, axes, feature_names, model_hash=None, scale=None, max_error=None):
+        self.table = table
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        self.feature_names = list(feature_names)
+        self.model_hash = model_hash
+        if scale is None:
+            scale = MISSING_UINT8 - 1 if table.dtype == np.uint8 else 1.0
+        self.scale = float(scale)
+        # Largest difference from the forest of any stored cell, if known
+        self.max_error = max_error
+        self.continuous = [i for i, name in enumerate(self.feature_names)
+                           if name not in CATEGORICAL_FEATURES]
+        # Value -> index maps for the single-row exact-hit fast path
+        self._positions = [{round(value, 6): i for i, value in enumerate(axis.tolist())}
+                           for axis in self.axes]
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(path + '.json') as f:
+            metadata = json.load(f)
+        table = np.load(path + '.npy', mmap_mode=mmap_mode)
+        return cls(table, metadata['axes'], metadata['feature_names'],
+                   model_hash=metadata.get('model_hash'), scale=metadata.get('scale'),
+                   max_error=metadata.get('max_error'))
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def _decode(self, cells):
+        """Probabilities of stored cells, NaN where the forest must score."""
+        probabilities = np.asarray(cells, dtype=np.float64) / self.scale
+        return np.where(_missing(cells), np.nan, probabilities)
+
+    def lookup_one(self, features):
+        """Probability for one exact grid point, or None when it is off-grid."""
+        try:
+            index = tuple(positions[round(value, 6)]
+                          for positions, value in zip(self._positions, features))
+        except KeyError:
+            return None
+        probability = float(self._decode(self.table[index]))
+        return None if np.isnan(probability) else probability
+
+    def lookup(self, X, interpolate=False, max_spread=MAX_INTERPOLATION_SPREAD):
+        """Return ``(probabilities, found)`` for the rows of ``X``.
+
+        Rows that are not on the grid, or whose cell is stored as missing,
+        have ``found`` False and a NaN probability. With ``interpolate``, that also covers rows outside
+        the grid, rows off-grid on a categorical axis, and rows whose cell
+        corners differ by more than ``max_spread`` or land within
+        ``TIER_MARGIN`` of a tier boundary.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows = X.shape[0]
+        found = np.ones(n_rows, dtype=bool)
+        lower, weight = [], []
+        for column, axis in enumerate(self.axes):
+            values = X[:, column]
+            position = np.clip(np.searchsorted(axis, values, side='right') - 1,
+                               0, len(axis) - 1)
+            exact = np.isclose(axis[position], values, rtol=0, atol=1e-6)
+            if interpolate and column in self.continuous:
+                upper = np.minimum(position + 1, len(axis) - 1)
+                span = axis[upper] - axis[position]
+                frac = np.where(span > 0, (values - axis[position]) / np.where(span > 0, span, 1), 0.0)
+                found &= (values >= axis[0]) & (values <= axis[-1])
+                weight.append(np.where(exact, 0.0, frac))
+            else:
+                found &= exact
+                weight.append(None)
+            lower.append(position)
+
+        probabilities = np.full(n_rows, np.nan)
+        if not found.any():
+            return probabilities, found
+
+        lower = [position[found] for position in lower]
+        axes_weighted = [i for i, w in enumerate(weight) if w is not None]
+        if not axes_weighted:
+            probabilities[found] = self._decode(self.table[tuple(lower)])
+            found &= ~np.isnan(probabilities)
+            return probabilities, found
+
+        # Multilinear interpolation over the 2^k corners of the continuous cell
+        weight = {i: weight[i][found] for i in axes_weighted}
+        result = np.zeros(int(found.sum()))
+        low = np.full_like(result, np.inf)
+        high = np.full_like(result, -np.inf)
+        for corner in range(1 << len(axes_weighted)):
+            index = list(lower)
+            corner_weight = np.ones_like(result)
+            for bit, axis_index in enumerate(axes_weighted):
+                if corner >> bit & 1:
+                    index[axis_index] = np.minimum(index[axis_index] + 1,
+                                                   len(self.axes[axis_index]) - 1)
+                    corner_weight *= weight[axis_index]
+                else:
+                    corner_weight *= 1 - weight[axis_index]
+            corner_probability = self._decode(self.table[tuple(index)])
+            result += np.where(corner_weight > 0, corner_weight * corner_probability, 0.0)
+            # Corners with no weight are the row's own grid values, not neighbours
+            low = np.where(corner_weight > 0, np.minimum(low, corner_probability), low)
+            high = np.where(corner_weight > 0, np.maximum(high, corner_probability), high)
+
+        # The forest is piecewise constant, so a blend is only trusted inside
+        # cells where it barely changes; every other row, and every row with
+        # a missing corner (NaN fails every comparison), goes to the forest
+        (low_tiers, low_labels), (high_tiers, high_labels) = _decisions(low), _decisions(high)
+        trusted = ((high - low <= max_spread) &
+                   (low_tiers == high_tiers) & (low_labels == high_labels) &
+                   (_boundary_distance(result) >= TIER_MARGIN))
+        rows = np.flatnonzero(found)
+        found[rows[~trusted]] = False
+        probabilities[rows[trusted]] = result[trusted]
+        return probabilities, found
+
+    def predict_proba(self, X, fallback, interpolate=False):
+        """Class probabilities from the table, scoring misses with ``fallback``.
+
+        ``fallback`` is any callable returning ``predict_proba``-style output.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if len(X) == 1:
+            positive = self.lookup_one(X[0].tolist())
+            if positive is not None:
+                return np.array([[1 - positive, positive]])
+        positive, found = self.lookup(X, interpolate=interpolate)
+        if not found.all():
+            positive[~found] = fallback(X[~found])[:, 1]
+        return np.column_stack([1 - positive, positive])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.lookup',
+                                     description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser(
+        'build', help='Precompute a lookup table',
+        description='Precompute a lookup table. Off-grid rows are scored by the forest; '
+                    'with HEART_RISK_LOOKUP_INTERPOLATE=1 only cells whose corners all agree '
+                    'are interpolated, so coarse steps mostly fall back to the forest.'
+    )
+    build.add_argument('path', help='Output path without extension')
+    build.add_argument('--step', action='append', default=[], metavar='FEATURE=STEP',
+                       help='Bin step for a continuous feature (repeatable)')
+    build.add_argument('--dtype', choices=DTYPES, default='uint8')
+    build.add_argument('--backend', default='sklearn')
+
+    info = commands.add_parser('info', help='Describe an existing table')
+    info.add_argument('path')
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        from .engine import HeartRiskPredictor
+
+        steps = {}
+        for item in args.step:
+            name, _, value = item.partition('=')
+            if name not in DEFAULT_STEPS:
+                parser.error(f"--step only applies to: {', '.join(DEFAULT_STEPS)}")
+            steps[name] = float(value)
+
+        predictor = HeartRiskPredictor.load(backend=args.backend)
+
+        def progress(done, total):
+            print(f"\r{done:,}/{total:,} cells", end='', flush=True)
+
+        table = build_table(predictor, args.path, steps=steps, dtype=args.dtype,
+                            progress=progress)
+        print(f"\nWrote {args.path}.npy ({table.nbytes / 1e6:.1f} MB)")
+    else:
+        table = RiskTable.load(args.path)
+        print(f"shape: {table.table.shape}  dtype: {table.table.dtype}  "
+              f"size: {table.nbytes / 1e6:.1f} MB  model: {table.model_hash}  "
+              f"max error: {table.max_error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Lightweight counters and timing histograms for the prediction hot path.
+
+Stages are timed with :func:`timed` and events counted with
+:func:`increment`; both are process-wide and thread-safe. The registry can
+be rendered in the Prometheus text format (served by the inference API at
+``GET /metrics`` or by :func:`start_http_exporter`) or summarised in a
+periodic log line by :func:`start_log_reporter`.
+
+Set ``HEART_RISK_METRICS=0`` to disable collection; every hook then
+returns immediately and :func:`timed` hands back a shared no-op context.
+
+Environment::
+
+    HEART_RISK_METRICS=1                  # 0 disables collection
+    HEART_RISK_METRICS_PORT=9100          # serve /metrics from the app process
+    HEART_RISK_METRICS_LOG_INTERVAL=60    # log a summary line every N seconds
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('HEART_RISK_METRICS', '1') != '0'
+EXPORTER_PORT = int(os.environ.get('HEART_RISK_METRICS_PORT', '0') or 0)
+LOG_INTERVAL = float(os.environ.get('HEART_RISK_METRICS_LOG_INTERVAL', '0') or 0)
+
+PREFIX = 'heart_risk'
+
+# Upper bounds in seconds, from a cached single-row lookup to a cold load
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bucket bound containing the ``q`` quantile (approximate)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """Named counters, gauges and per-stage histograms."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.counters = {}
+        self.gauges = {}
+        self.stages = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def timed(self, stage):
+        """Context manager recording the wall time of a block under ``stage``."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.stages.clear()
+
+    def render_prometheus(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            stages = sorted((stage, list(h.counts), h.count, h.sum)
+                            for stage, h in self.stages.items())
+        lines = []
+        for name, value in counters:
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines.append(f"{PREFIX}_{name}_total {value}")
+        for name, value in gauges:
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"{PREFIX}_{name} {value}")
+        if stages:
+            name = f"{PREFIX}_stage_seconds"
+            lines.append(f"# HELP {name} Wall time per instrumented stage")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, counts, count, total in stages:
+                cumulative = 0
+                for bound, bucket_count in zip(DEFAULT_BUCKETS + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One-line human-readable summary, for periodic logging."""
+        with self._lock:
+            parts = [f"{name}={value}" for name, value in sorted(self.counters.items())]
+            parts += [f"{name}={value:g}" for name, value in sorted(self.gauges.items())]
+            for stage, histogram in sorted(self.stages.items()):
+                mean_ms = histogram.sum / histogram.count * 1000
+                p99_ms = histogram.quantile(0.99) * 1000
+                parts.append(f"{stage}[n={histogram.count} mean={mean_ms:.2f}ms "
+                             f"p99<={p99_ms:g}ms]")
+        return ' '.join(parts) or 'no metrics recorded'
+
+
+class _Timer:
+    __slots__ = ('registry', 'stage', 'started')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+REGISTRY = MetricsRegistry(enabled=ENABLED)
+
+increment = REGISTRY.increment
+set_gauge = REGISTRY.set_gauge
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+render_prometheus = REGISTRY.render_prometheus
+
+
+def start_log_reporter(interval=LOG_INTERVAL, registry=REGISTRY):
+    """Log ``registry.summary()`` every ``interval`` seconds from a daemon
+    thread; returns the thread, or None when disabled."""
+    if not registry.enabled or interval <= 0:
+        return None
+
+    def report():
+        while True:
+            time.sleep(interval)
+            logger.info("metrics %s", registry.summary())
+
+    thread = threading.Thread(target=report, name='heart-risk-metrics-log', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_http_exporter(port=EXPORTER_PORT, host='0.0.0.0', registry=REGISTRY):
+    """Serve ``GET /metrics`` from a daemon thread; returns the server, or
+    None when disabled or the port is already taken (e.g. by another
+    worker on the same host)."""
+    if not registry.enabled or not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        logger.warning("Metrics exporter not started on port %s: %s", port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name='heart-risk-metrics-http',
+                     daemon=True).start()
+    return server
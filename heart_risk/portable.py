@@ -0,0 +1,110 @@
+"""Self-contained NumPy runtime for an exported heart risk model.
+
+This file depends on NumPy and the standard library only, and imports
+nothing else from the package. It can be copied on its own into a small
+container next to a model file written by :mod:`heart_risk.export`.
+
+Model format (one uncompressed ``.npz``, read with ``allow_pickle=False``)::
+
+    feature     int8/int16   split feature per node (0 for leaves)
+    threshold   float32      go left when x <= threshold (inputs as float32)
+    left        int16/int32  left child per node; leaves point to themselves
+    right       int16/int32  right child per node; leaves point to themselves
+    value       float32      positive-class probability per node
+    roots       int16/int32  root node of each tree
+    metadata    str          JSON: format_version, feature_names, classes,
+                             max_depth, model_hash, model_info, parity
+
+Node indices are global across the forest. Every row is advanced
+``max_depth`` times from each root, and the positive-class probability is
+the mean leaf value over trees. This is the same traversal as
+``heart_risk.flat_forest``, repeated here so the file stays standalone.
+
+Usage::
+
+    python portable.py heart_risk_model.npz < records.json
+"""
+import json
+import sys
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+class PortableModel:
+    """Binary tree-ensemble classifier loaded from an exported ``.npz``."""
+
+    def __init__(self, feature, threshold, left, right, value, roots, metadata):
+        # Stored narrow on disk; widened once so every gather uses native indices
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float32)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float32)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.metadata = metadata
+        self.feature_names = list(metadata['feature_names'])
+        self.classes_ = np.asarray(metadata['classes'])
+        self.max_depth = int(metadata['max_depth'])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            metadata = json.loads(str(arrays['metadata']))
+            if metadata.get('format_version') != FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported model format {metadata.get('format_version')!r}"
+                )
+            return cls(arrays['feature'], arrays['threshold'], arrays['left'],
+                       arrays['right'], arrays['value'], arrays['roots'], metadata)
+
+    @property
+    def model_hash(self):
+        return self.metadata.get('model_hash')
+
+    def as_features(self, X):
+        """``X`` (rows of values, or mappings keyed by feature name) as a
+        2D float32 array in the model's feature order."""
+        if len(X) and isinstance(X[0], dict):
+            X = [[record[name] for name in self.feature_names] for record in X]
+        features = np.asarray(X, dtype=np.float32)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != len(self.feature_names):
+            raise ValueError(
+                f"Expected {len(self.feature_names)} features, got {features.shape[1]}"
+            )
+        return features
+
+    def predict_proba(self, X):
+        features = self.as_features(X)
+        nodes = np.broadcast_to(self.roots, (features.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            values = np.take_along_axis(features, self.feature[nodes], axis=1)
+            nodes = np.where(values <= self.threshold[nodes], self.left[nodes],
+                             self.right[nodes])
+        positive = self.value[nodes].sum(axis=1, dtype=np.float64) / len(self.roots)
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.exit("usage: python portable.py MODEL.npz < records.json")
+    model = PortableModel.load(argv[0])
+    records = json.load(sys.stdin)
+    if isinstance(records, dict):
+        records = [records]
+    probabilities = model.predict_proba(records)
+    labels = model.classes_.take(probabilities.argmax(axis=1))
+    json.dump([{'prediction': int(label), 'risk_probability': round(float(p) * 100, 1)}
+               for label, p in zip(labels, probabilities[:, 1])], sys.stdout)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Hot reload of the model files behind a running predictor.
+
+:class:`ModelWatcher` owns the active :class:`HeartRiskPredictor` and
+polls its source (the bundle manifest, or the three pickles) from a
+daemon thread. A cheap mtime/size signature is checked every interval;
+only when it changes is the model hashed. A new hash is loaded in the
+background and checked by :func:`smoke_test`. Only then is it swapped in
+with one attribute assignment. Until the swap, and whenever loading or
+the smoke test fails, the old predictor keeps serving.
+
+Callers read :attr:`ModelWatcher.current` once per request (or Streamlit
+rerun), so each request is scored end to end by a single model version.
+The new predictor starts with an empty copy of the prediction cache, so
+no result of the old model is served after the swap. The drift
+monitor is shared and reset, since its risk histogram describes one model.
+
+Environment::
+
+    HEART_RISK_RELOAD_INTERVAL=30    # seconds between polls, 0 disables
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from . import metrics
+from .engine import MODEL_FILES, HeartRiskPredictor, file_sha256, reference_inputs
+
+logger = logging.getLogger(__name__)
+
+RELOAD_INTERVAL = float(os.environ.get('HEART_RISK_RELOAD_INTERVAL', '30') or 0)
+
+# Largest flat-vs-sklearn probability difference a new model may show
+PARITY_TOLERANCE = 1e-9
+
+
+class ReloadRejectedError(ValueError):
+    """Raised when a newly loaded model fails the smoke test."""
+
+
+def smoke_test(candidate, active):
+    """Check ``candidate`` can replace ``active``; raises ReloadRejectedError.
+
+    The feature order must be unchanged (the app's widgets and the API
+    schema are built from it), the reference inputs must score to finite
+    probabilities in [0, 1], and when the sklearn model is loaded the
+    active backend must agree with it on labels and probabilities.
+    """
+    if candidate.feature_names != active.feature_names:
+        raise ReloadRejectedError(
+            f"Feature order changed: {candidate.feature_names} != {active.feature_names}"
+        )
+    batch = candidate.predict_batch(reference_inputs())
+    if not np.all(np.isfinite(batch.probabilities)) or not (
+            np.all(batch.probabilities >= 0) and np.all(batch.probabilities <= 1)):
+        raise ReloadRejectedError("Reference inputs scored outside [0, 1]")
+    if candidate.model is not None:
+        mismatches = candidate.verify_label_parity()
+        if mismatches:
+            raise ReloadRejectedError(f"{mismatches} reference labels differ from model.predict")
+        deviation = candidate.max_proba_deviation()
+        if deviation > PARITY_TOLERANCE:
+            raise ReloadRejectedError(f"Backend probabilities deviate by {deviation:.3g}")
+
+
+class ModelWatcher:
+    """Serves :attr:`current` and swaps in new model versions as they land."""
+
+    def __init__(self, predictor, interval=RELOAD_INTERVAL):
+        from .bundle import is_bundle
+
+        self.current = predictor
+        self.interval = interval
+        self.reloads = 0
+        self.last_error = None
+        self.loaded_at = time.time()
+        self._is_bundle = is_bundle(predictor.source_dir)
+        self._signature = self._read_signature()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def _paths(self):
+        from .bundle import MANIFEST_NAME
+
+        source_dir = self.current.source_dir
+        if self._is_bundle:
+            return [os.path.join(source_dir, MANIFEST_NAME)]
+        return [os.path.join(source_dir, filename) for filename in MODEL_FILES.values()]
+
+    def _read_signature(self):
+        try:
+            return tuple((stat.st_mtime_ns, stat.st_size)
+                         for stat in map(os.stat, self._paths))
+        except OSError:
+            return None  # Mid-deploy; compared again on the next poll
+
+    def _read_hash(self):
+        if self._is_bundle:
+            from .bundle import read_manifest
+
+            return read_manifest(self.current.source_dir)['model_hash']
+        return file_sha256(os.path.join(self.current.source_dir, MODEL_FILES['model']))
+
+    def _load(self, model_hash):
+        from .engine import LOOKUP_TABLE
+
+        active = self.current
+        # A lookup table is only carried over if it was rebuilt for the new model
+        lookup_table = False
+        if LOOKUP_TABLE:
+            from .lookup import RiskTable
+
+            table = RiskTable.load(LOOKUP_TABLE)
+            if table.model_hash == model_hash:
+                lookup_table = table
+            else:
+                logger.warning("Lookup table %s is for another model; serving without it",
+                               LOOKUP_TABLE)
+        # A fresh cache: the active one must keep serving the old model
+        cache = False if active.cache is None else active.cache.empty_copy()
+        options = dict(backend=active.backend, lookup_table=lookup_table, cache=cache,
+                       monitor=False if active.monitor is None else active.monitor)
+        if self._is_bundle:
+            return HeartRiskPredictor.from_bundle(active.source_dir, **options)
+        return HeartRiskPredictor.from_directory(active.source_dir, **options)
+
+    def check(self):
+        """Reload if the model files changed; returns True when a new
+        version was swapped in."""
+        with self._lock:
+            signature = self._read_signature()
+            if signature is None or signature == self._signature:
+                return False
+            started = time.perf_counter()
+            try:
+                model_hash = self._read_hash()
+                if model_hash == self.current.model_hash:
+                    self._signature = signature  # Touched but unchanged
+                    return False
+                with metrics.timed('reload'):
+                    candidate = self._load(model_hash)
+                    smoke_test(candidate, self.current)
+            except Exception as e:
+                # Keep serving the old model; a half-written deploy changes
+                # the signature again once complete and is retried then
+                self._signature = signature
+                self.last_error = e
+                metrics.increment('model_reload_errors')
+                logger.warning("Model reload from %s rejected: %s",
+                               self.current.source_dir, e)
+                return False
+
+            candidate.load_seconds = time.perf_counter() - started
+            previous = self.current
+            if candidate.monitor is not None:
+                candidate.monitor.reset()
+            self.current = candidate
+            self._signature = signature
+            self.reloads += 1
+            self.last_error = None
+            self.loaded_at = time.time()
+            metrics.increment('model_reloads')
+            logger.info("Model reloaded: %s -> %s", previous.version, candidate.version)
+            return True
+
+    def start(self):
+        """Poll every ``interval`` seconds from a daemon thread; returns the
+        thread, or None when disabled."""
+        if self.interval <= 0 or self._thread is not None:
+            return self._thread
+
+        def poll():
+            while not self._stop.wait(self.interval):
+                self.check()
+
+        self._thread = threading.Thread(target=poll, name='heart-risk-model-reload',
+                                        daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,147 @@
+"""Column-wise validation and coercion of the 13 clinical input features.
+
+A :class:`FeatureSchema` is built for the model's ``feature_names`` (in
+that order) from the per-feature specs below. It validates whole columns
+at once with NumPy, so a batch of any size costs a fixed number of array
+operations per feature, and it never aborts on a bad row: invalid rows are
+flagged in ``valid`` and described in ``errors``.
+
+The bounds are those of the app's input widgets, i.e. the domain the model
+is served for. ``thal`` accepts the four codes the app offers (1, 3, 6, 7).
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+class SchemaError(ValueError):
+    """Raised when inputs cannot be validated at all (e.g. missing columns)."""
+
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    name: str
+    minimum: float
+    maximum: float
+    integer: bool = True
+    codes: tuple = None  # Allowed values of a categorical feature
+
+    def check(self, column):
+        """Return ``(mask, message)`` pairs for the rows of ``column`` that
+        break this spec; each row appears under at most one message."""
+        missing = np.isnan(column)
+        problems = [(missing, f"{self.name}: missing or not numeric")]
+        if self.codes is not None:
+            bad = ~np.isin(column, self.codes) & ~missing
+            problems.append((bad, f"{self.name}: must be one of {', '.join(map(str, self.codes))}"))
+            return problems
+
+        # NaN compares False, so missing rows never count as out of range
+        bad = (column < self.minimum) | (column > self.maximum)
+        problems.append((bad, f"{self.name}: must be between {self.minimum:g} and {self.maximum:g}"))
+        if self.integer:
+            fractional = (column != np.floor(column)) & ~bad & ~missing
+            problems.append((fractional, f"{self.name}: must be a whole number"))
+        return problems
+
+
+FEATURE_SPECS = {spec.name: spec for spec in (
+    FeatureSpec('age', 20, 100),
+    FeatureSpec('sex', 0, 1, codes=(0, 1)),
+    FeatureSpec('cp', 0, 3, codes=(0, 1, 2, 3)),
+    FeatureSpec('trestbps', 80, 200),
+    FeatureSpec('chol', 100, 400),
+    FeatureSpec('fbs', 0, 1, codes=(0, 1)),
+    FeatureSpec('restecg', 0, 2, codes=(0, 1, 2)),
+    FeatureSpec('thalach', 60, 220),
+    FeatureSpec('exang', 0, 1, codes=(0, 1)),
+    FeatureSpec('oldpeak', 0.0, 6.0, integer=False),
+    FeatureSpec('slope', 0, 2, codes=(0, 1, 2)),
+    FeatureSpec('ca', 0, 3, codes=(0, 1, 2, 3)),
+    FeatureSpec('thal', 1, 7, codes=(1, 3, 6, 7)),
+)}
+
+
+@dataclass(frozen=True)
+class ValidationResult:
+    features: np.ndarray  # (n, n_features) C-contiguous float64, model feature order
+    valid: np.ndarray  # Boolean mask of rows with no errors
+    errors: np.ndarray  # '; '-joined messages per row, '' when valid
+
+    @property
+    def n_invalid(self):
+        return int(len(self.valid) - np.count_nonzero(self.valid))
+
+
+class FeatureSchema:
+    """Validator for inputs in a model's feature order."""
+
+    def __init__(self, feature_names, specs=FEATURE_SPECS):
+        unknown = [name for name in feature_names if name not in specs]
+        if unknown:
+            raise SchemaError(f"No schema for features: {', '.join(unknown)}")
+        self.feature_names = list(feature_names)
+        self.specs = [specs[name] for name in self.feature_names]
+
+    def validate(self, X):
+        """Validate a DataFrame (columns matched case-insensitively) or a 2D
+        array-like already in feature order."""
+        if hasattr(X, 'columns'):
+            return self.validate_frame(X)
+        return self.validate_array(X)
+
+    def validate_frame(self, frame):
+        import pandas as pd
+
+        columns = {str(c).strip().lower(): c for c in frame.columns}
+        missing = [name for name in self.feature_names if name.lower() not in columns]
+        if missing:
+            raise SchemaError(f"Missing required columns: {', '.join(missing)}")
+
+        # Fill one preallocated array column by column; no intermediate frame
+        features = np.empty((len(frame), len(self.feature_names)), dtype=np.float64)
+        for j, name in enumerate(self.feature_names):
+            column = frame[columns[name.lower()]]
+            if not pd.api.types.is_numeric_dtype(column):
+                column = pd.to_numeric(column, errors='coerce')
+            features[:, j] = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        return self._check(features)
+
+    def validate_array(self, X):
+        array = np.asarray(X)
+        if array.ndim == 1:
+            array = array.reshape(1, -1)
+        if array.ndim != 2 or array.shape[1] != len(self.feature_names):
+            raise SchemaError(
+                f"Expected {len(self.feature_names)} features, got shape {array.shape}"
+            )
+        if array.dtype.kind in 'biuf':
+            # Numeric input is used as is when already float64 and C-contiguous
+            features = np.ascontiguousarray(array, dtype=np.float64)
+        else:
+            import pandas as pd
+
+            features = np.empty(array.shape, dtype=np.float64)
+            for j in range(array.shape[1]):
+                features[:, j] = pd.to_numeric(pd.Series(array[:, j]), errors='coerce')
+        return self._check(features)
+
+    def _check(self, features):
+        invalid = np.zeros(len(features), dtype=bool)
+        problems = []
+        for j, spec in enumerate(self.specs):
+            for mask, message in spec.check(features[:, j]):
+                if mask.any():
+                    invalid |= mask
+                    problems.append((mask, message))
+
+        # Messages are only assembled for the (usually few) invalid rows
+        errors = np.full(len(features), '', dtype=object)
+        if problems:
+            rows = np.flatnonzero(invalid)
+            messages = [[] for _ in rows]
+            for mask, message in problems:
+                for i in np.flatnonzero(mask[rows]):
+                    messages[i].append(message)
+            errors[rows] = ['; '.join(parts) for parts in messages]
+        return ValidationResult(features=features, valid=~invalid, errors=errors)
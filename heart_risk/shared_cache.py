@@ -0,0 +1,323 @@
+"""Prediction cache shared by every process on a host, backed by SQLite.
+
+:class:`SqliteResultCache` has the :class:`PredictionCache` interface and
+stores results in one SQLite file, keyed by model hash and canonical
+feature tuple. Streamlit replicas and API workers on a host all read and
+write it, and it survives restarts. Entries expire after ``ttl`` seconds.
+Once the table grows past ``max_entries``, the oldest entries are evicted
+first. Eviction is by insertion time, not LRU, so reads never write. The
+file runs in WAL mode, which lets readers proceed while one process
+writes. Each thread gets its own connection. A locked or broken database
+is logged and treated as a miss, and a file that cannot be opened at all
+disables the cache, so the cache never fails a prediction.
+
+:class:`TieredCache` puts the in-process LRU in front of it. That is the
+predictor's default cache when ``HEART_RISK_SHARED_CACHE`` points at a
+database file.
+
+Usage::
+
+    python -m heart_risk.shared_cache warm profiles.csv [--path results.db]
+    python -m heart_risk.shared_cache stats [--path results.db]
+    python -m heart_risk.shared_cache prune [--path results.db]
+
+Environment::
+
+    HEART_RISK_SHARED_CACHE=/var/cache/heart_risk/results.db
+    HEART_RISK_SHARED_CACHE_TTL=604800        # seconds
+    HEART_RISK_SHARED_CACHE_SIZE=1000000      # entries
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import canonical_key
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_PATH = os.environ.get('HEART_RISK_SHARED_CACHE')
+DEFAULT_TTL = float(os.environ.get('HEART_RISK_SHARED_CACHE_TTL', str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('HEART_RISK_SHARED_CACHE_SIZE', '1000000'))
+
+# Expired and surplus entries are pruned once every this many writes
+PRUNE_EVERY = 1000
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS results (
+        model_hash TEXT NOT NULL,
+        key TEXT NOT NULL,
+        label INTEGER NOT NULL,
+        probability REAL NOT NULL,
+        risk_level TEXT NOT NULL,
+        created REAL NOT NULL,
+        expires REAL NOT NULL,
+        PRIMARY KEY (model_hash, key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS results_created ON results (created);
+"""
+
+
+def _encode_key(key):
+    return json.dumps(list(key))
+
+
+class SqliteResultCache:
+    """Process-safe prediction cache in a local SQLite file.
+
+    Unlike :class:`PredictionCache`, :meth:`bind` does not clear anything:
+    entries of other model hashes may still serve other replicas, and are
+    never returned for this one. If the file cannot be opened or its
+    schema created, the cache logs it and stays ``disabled``: every get is
+    a miss and writes are dropped.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.model_hash = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.disabled = False
+        try:
+            self._connection().executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            self.errors += 1
+            self.disabled = True
+            logger.warning("Shared cache %s is unusable, disabling it: %s", path, e)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        if self.disabled:
+            return 0
+        try:
+            return self._connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    @property
+    def maxsize(self):
+        return self.max_entries
+
+    def empty_copy(self):
+        return SqliteResultCache(self.path, self.ttl, self.max_entries)
+
+    def bind(self, model_hash):
+        self.model_hash = model_hash
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        from .engine import Prediction
+
+        if self.disabled:
+            self._count('misses')
+            return None
+        try:
+            row = self._connection().execute(
+                'SELECT label, probability, risk_level FROM results '
+                'WHERE model_hash = ? AND key = ? AND expires > ?',
+                (self.model_hash or '', _encode_key(key), time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.warning("Shared cache read failed: %s", e)
+            row = None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return Prediction(label=row[0], probability=row[1], risk_level=row[2])
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        """Store ``(key, prediction)`` pairs in one transaction."""
+        if self.disabled:
+            return
+        now = time.time()
+        rows = [(self.model_hash or '', _encode_key(key), int(prediction.label),
+                 float(prediction.probability), str(prediction.risk_level), now, now + self.ttl)
+                for key, prediction in items]
+        try:
+            connection = self._connection()
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+                )
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.warning("Shared cache write failed: %s", e)
+            return
+        with self._lock:
+            self._writes += len(rows)
+            due = self._writes >= PRUNE_EVERY
+            if due:
+                self._writes = 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Delete expired entries, then the oldest ones above ``max_entries``;
+        returns the number of rows deleted."""
+        if self.disabled:
+            return 0
+        try:
+            connection = self._connection()
+            with connection:
+                deleted = connection.execute('DELETE FROM results WHERE expires <= ?',
+                                             (time.time(),)).rowcount
+                surplus = connection.execute('SELECT COUNT(*) FROM results').fetchone()[0] \
+                    - self.max_entries
+                if surplus > 0:
+                    deleted += connection.execute(
+                        'DELETE FROM results WHERE (model_hash, key) IN '
+                        '(SELECT model_hash, key FROM results ORDER BY created LIMIT ?)',
+                        (surplus,)
+                    ).rowcount
+            return deleted
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.warning("Shared cache prune failed: %s", e)
+            return 0
+
+    def clear(self):
+        """Drop the entries of the bound model hash."""
+        if self.disabled:
+            return
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute('DELETE FROM results WHERE model_hash = ?',
+                                   (self.model_hash or '',))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache clear failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'disabled': self.disabled,
+                'size': len(self),
+                'maxsize': self.max_entries
+            }
+
+
+class TieredCache:
+    """In-process LRU in front of a shared cache; shared hits fill the LRU."""
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def __len__(self):
+        return len(self.local)
+
+    @property
+    def maxsize(self):
+        return self.local.maxsize
+
+    @property
+    def model_hash(self):
+        return self.local.model_hash
+
+    def empty_copy(self):
+        return TieredCache(self.local.empty_copy(), self.shared.empty_copy())
+
+    def bind(self, model_hash):
+        self.local.bind(model_hash)
+        self.shared.bind(model_hash)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.local.put(key, value)
+        self.shared.put(key, value)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        return dict(self.local.stats(), shared=self.shared.stats())
+
+
+def warm(cache, predictor, frame, chunk_size=50_000):
+    """Score the valid rows of ``frame`` and store them for ``predictor``'s
+    model; returns the number of entries written."""
+    cache.bind(predictor.model_hash)
+    validation = predictor.schema.validate_frame(frame)
+    features = validation.features[validation.valid]
+    written = 0
+    for start in range(0, len(features), chunk_size):
+        chunk = features[start:start + chunk_size]
+        batch = predictor.predict_batch(chunk)
+        cache.put_many((canonical_key(row), batch[index]) for index, row in enumerate(chunk))
+        written += len(chunk)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.shared_cache',
+                                     description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    warm_parser = commands.add_parser('warm', help='Precompute results for common profiles')
+    warm_parser.add_argument('profiles', help='CSV or Parquet file with the 13 feature columns')
+    commands.add_parser('stats', help='Entry count and hit statistics')
+    commands.add_parser('prune', help='Delete expired and surplus entries')
+    for command in commands.choices.values():
+        command.add_argument('--path', default=SHARED_CACHE_PATH,
+                             required=SHARED_CACHE_PATH is None,
+                             help='Cache database (default: HEART_RISK_SHARED_CACHE)')
+    args = parser.parse_args(argv)
+
+    cache = SqliteResultCache(args.path)
+    if args.command == 'warm':
+        import pandas as pd
+
+        from .engine import HeartRiskPredictor
+
+        predictor = HeartRiskPredictor.load(cache=False, monitor=False)
+        if args.profiles.lower().endswith(('.parquet', '.pq')):
+            frame = pd.read_parquet(args.profiles)
+        else:
+            frame = pd.read_csv(args.profiles)
+        started = time.perf_counter()
+        written = warm(cache, predictor, frame)
+        print(f"Cached {written:,} of {len(frame):,} profiles for model {predictor.version} "
+              f"in {time.perf_counter() - started:.1f} s")
+    elif args.command == 'stats':
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        print(f"Deleted {cache.prune():,} entries")
+
+
+if __name__ == '__main__':
+    main()
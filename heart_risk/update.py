@@ -0,0 +1,203 @@
+"""Fold newly labelled outcomes into the forest without retraining it.
+
+An update warm-starts the existing ``RandomForestClassifier``: with
+``warm_start`` set and ``n_estimators`` raised by ``--add``, sklearn fits
+only the new trees, on the new rows alone. The forest is then cut back
+to ``--budget`` trees. Either the oldest trees are retired (the forest
+keeps them in fit order) or the weakest: the old trees with the lowest
+accuracy on the new rows. New trees are never retired by the update that
+added them.
+
+A stratified share of the new rows (``--holdout``) is kept out of the
+fit and used to score the forest before and after the update. Fitting
+and ranking only touch the new rows, so an update costs
+O(new rows x trees) whatever the size of the history. If holdout
+accuracy drops by more than ``--max-drop`` nothing is written, unless
+``--force`` is given.
+
+The model files are rewritten in place (or under ``--out``). Each file
+is replaced atomically, the model pickle last, so a running app
+hot-reloads (see :mod:`heart_risk.reload`) straight to the new model.
+``model_info['updates']`` keeps a log of every update.
+
+Usage::
+
+    python -m heart_risk.update followups.csv [--source DIR] [--out DIR]
+                                [--add 20] [--budget 100] [--retire weakest]
+                                [--max-drop 0.01] [--force]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from .engine import MODEL_FILES
+
+RETIRE_POLICIES = ('oldest', 'weakest')
+DEFAULT_ADD = 20
+
+# Largest fall in holdout accuracy an update may cause and still be written
+MAX_ACCURACY_DROP = 0.01
+
+
+class UpdateRejectedError(ValueError):
+    """Raised when an update makes the holdout accuracy worse; ``entry`` is
+    the update log entry that was not written."""
+
+    def __init__(self, entry, max_drop):
+        self.entry = entry
+        super().__init__(
+            f"Holdout accuracy fell from {entry['holdout_accuracy_before']:.4f} to "
+            f"{entry['holdout_accuracy_after']:.4f}, more than {max_drop:.4f}; "
+            "nothing was written"
+        )
+
+
+def tree_accuracies(model, X, y):
+    """Accuracy of each tree of ``model`` on ``(X, y)``."""
+    X = np.asarray(X, dtype=np.float32)
+    return np.array([np.mean(model.classes_.take(tree.predict(X).astype(int)) == y)
+                     for tree in model.estimators_])
+
+
+def update_forest(model, X, y, n_add=DEFAULT_ADD, budget=None, retire='weakest'):
+    """Add ``n_add`` trees fitted on ``(X, y)`` to ``model`` and retire old
+    trees down to ``budget`` (default: the current size). Modifies ``model``
+    in place; returns the indices of the retired trees (pre-update order)."""
+    if retire not in RETIRE_POLICIES:
+        raise ValueError(f"Unknown retire policy {retire!r}; expected one of "
+                         f"{', '.join(RETIRE_POLICIES)}")
+    if set(np.unique(y)) != set(model.classes_.tolist()):
+        raise ValueError("New data must contain every class the model was trained on")
+    n_old = len(model.estimators_)
+    budget = n_old if budget is None else budget
+    if budget < n_add:
+        raise ValueError(f"A budget of {budget} trees cannot hold {n_add} new ones")
+
+    # Rank old trees on the new rows before fitting, while they are alone
+    n_retire = max(n_old + n_add - budget, 0)
+    if retire == 'oldest':
+        retired = np.arange(n_retire)
+    else:
+        retired = np.sort(np.argsort(tree_accuracies(model, X, y), kind='stable')[:n_retire])
+
+    model.set_params(warm_start=True, n_estimators=n_old + n_add)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+
+    keep = np.setdiff1d(np.arange(n_old + n_add), retired)
+    model.estimators_ = [model.estimators_[index] for index in keep]
+    model.n_estimators = len(model.estimators_)
+    return retired.tolist()
+
+
+def _replace(obj, path):
+    import joblib
+
+    joblib.dump(obj, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def update_model_files(source_dir, data_path, out_dir=None, target='target',
+                       n_add=DEFAULT_ADD, budget=None, retire='weakest', holdout=0.2,
+                       seed=42, dry_run=False, max_drop=MAX_ACCURACY_DROP, force=False):
+    """Update the model files in ``source_dir`` with the rows of
+    ``data_path``; returns the update log entry.
+
+    Raises :class:`UpdateRejectedError` without writing when holdout
+    accuracy falls by more than ``max_drop``, unless ``force`` is set.
+    """
+    import joblib
+    from sklearn.model_selection import train_test_split
+
+    from .train import load_dataset
+
+    started = time.perf_counter()
+    paths = {key: os.path.join(source_dir, filename) for key, filename in MODEL_FILES.items()}
+    model = joblib.load(paths['model'])
+    feature_names = joblib.load(paths['features'])
+    model_info = joblib.load(paths['info'])
+
+    X, y, dataset_hash = load_dataset(data_path, target)
+    X_fit, X_test, y_fit, y_test = train_test_split(
+        X, y, test_size=holdout, stratify=y, random_state=seed
+    )
+    accuracy_before = float(np.mean(model.predict(X_test) == y_test))
+    retired = update_forest(model, X_fit, y_fit, n_add=n_add, budget=budget, retire=retire)
+    accuracy_after = float(np.mean(model.predict(X_test) == y_test))
+
+    entry = {
+        'dataset_sha256': dataset_hash,
+        'rows': {'fit': len(X_fit), 'holdout': len(X_test)},
+        'added': n_add,
+        'retired': len(retired),
+        'retire_policy': retire,
+        'n_estimators': model.n_estimators,
+        'holdout_accuracy_before': accuracy_before,
+        'holdout_accuracy_after': accuracy_after,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    if dry_run:
+        return entry
+    if accuracy_before - accuracy_after > max_drop:
+        if not force:
+            raise UpdateRejectedError(entry, max_drop)
+        entry['forced'] = True
+
+    model_info = dict(model_info)
+    model_info['updates'] = list(model_info.get('updates', [])) + [entry]
+    out_dir = out_dir or source_dir
+    os.makedirs(out_dir, exist_ok=True)
+    _replace(model_info, os.path.join(out_dir, MODEL_FILES['info']))
+    _replace(feature_names, os.path.join(out_dir, MODEL_FILES['features']))
+    _replace(model, os.path.join(out_dir, MODEL_FILES['model']))
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m heart_risk.update',
+                                     description=__doc__.split('\n\n')[0])
+    parser.add_argument('data', help='CSV or Parquet file of new labelled rows')
+    parser.add_argument('--source', default=None,
+                        help='Directory with the .pkl files (default: the usual search)')
+    parser.add_argument('--out', default=None, help='Write here instead of in place')
+    parser.add_argument('--target', default='target', help='Binary label column')
+    parser.add_argument('--add', type=int, default=DEFAULT_ADD, help='New trees to fit')
+    parser.add_argument('--budget', type=int, default=None,
+                        help='Trees to keep after the update (default: current size)')
+    parser.add_argument('--retire', choices=RETIRE_POLICIES, default='weakest')
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help='Share of the new rows used only for before/after accuracy')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--max-drop', type=float, default=MAX_ACCURACY_DROP,
+                        help='Largest holdout accuracy drop that is still written '
+                             f'(default {MAX_ACCURACY_DROP})')
+    parser.add_argument('--force', action='store_true',
+                        help='Write the update even if holdout accuracy drops more')
+    parser.add_argument('--dry-run', action='store_true', help='Report without writing')
+    args = parser.parse_args(argv)
+
+    source = args.source
+    if source is None:
+        from .engine import HeartRiskPredictor
+
+        source = HeartRiskPredictor.load(prefer_bundle=False, cache=False,
+                                         monitor=False).source_dir
+    try:
+        entry = update_model_files(source, args.data, out_dir=args.out, target=args.target,
+                                   n_add=args.add, budget=args.budget, retire=args.retire,
+                                   holdout=args.holdout, seed=args.seed, dry_run=args.dry_run,
+                                   max_drop=args.max_drop, force=args.force)
+    except UpdateRejectedError as e:
+        parser.exit(1, f"{e}; rerun with --force to write it anyway\n")
+    print(f"+{entry['added']} / -{entry['retired']} trees ({entry['retire_policy']}) -> "
+          f"{entry['n_estimators']}; holdout accuracy {entry['holdout_accuracy_before']:.4f} "
+          f"-> {entry['holdout_accuracy_after']:.4f} in {entry['seconds']:.2f} s"
+          + (" (dry run)" if args.dry_run else f"; wrote {args.out or source}"),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
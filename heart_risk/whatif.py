@@ -0,0 +1,114 @@
+"""What-if sensitivity sweeps around a single patient profile.
+
+A sweep varies one or two features across their full widget range while
+holding the rest of the profile fixed. Every grid point becomes one row of
+a single feature matrix, so a 2D sweep of cholesterol (301 values) by max
+heart rate (161 values) is one vectorized ``predict_batch`` call
+instead of one forest pass per slider position.
+
+Grid values that fall between the same pair of split thresholds of a
+feature take the same path through every tree, so only one value per
+threshold bin is scored and the result is broadcast back to the full
+grid. This is exact and cuts the cholesterol x heart rate sweep from
+~48k to ~12k rows.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import metrics
+from .engine import WIDGET_DOMAIN
+
+MAX_SWEEP_FEATURES = 2
+
+
+def sweep_values(feature):
+    """All values of ``feature`` reachable from its app widget."""
+    for name, values in WIDGET_DOMAIN:
+        if name == feature:
+            return values.astype(np.float64)
+    raise ValueError(f"Unknown feature {feature!r}")
+
+
+def split_thresholds(predictor, column):
+    """Sorted distinct thresholds the forest uses to split on ``column``."""
+    forest = predictor.forest
+    if forest is not None:
+        internal = forest.children_left != np.arange(forest.node_count)
+        thresholds = forest.threshold[internal & (forest.feature == column)]
+    else:
+        thresholds = np.concatenate([
+            estimator.tree_.threshold[estimator.tree_.feature == column]
+            for estimator in predictor.model.estimators_
+        ])
+    return np.unique(thresholds)
+
+
+def _distinct_values(predictor, column, axis):
+    """Indices of one representative per threshold bin of ``axis``, and
+    the bin of every axis value."""
+    # Trees compare float32 inputs, so bin the values the way they are seen
+    seen = axis.astype(np.float32).astype(np.float64)
+    bins = np.searchsorted(split_thresholds(predictor, column), seen, side='left')
+    _, representatives, inverse = np.unique(bins, return_index=True, return_inverse=True)
+    return representatives, inverse
+
+
+@dataclass(frozen=True)
+class Sweep:
+    features: tuple  # Swept feature names, in axis order
+    axes: tuple  # Grid values per swept feature
+    risk_prob: np.ndarray  # Risk % with shape tuple(len(axis) for axis in axes)
+    current: tuple  # The profile's own value of each swept feature
+    rows_scored: int  # Rows actually scored, one per threshold bin combination
+
+    @property
+    def baseline_index(self):
+        """Nearest grid position of the unswept profile along each axis."""
+        return tuple(int(np.abs(axis - value).argmin())
+                     for axis, value in zip(self.axes, self.current))
+
+    @property
+    def baseline_risk(self):
+        return float(self.risk_prob[self.baseline_index])
+
+
+def sweep(predictor, profile, features, values=None):
+    """Score ``profile`` with each of ``features`` swept over a grid.
+
+    ``profile`` is a record (sequence in feature order or mapping).
+    ``values`` optionally overrides the grid per feature; by default each
+    feature spans its whole widget range.
+    """
+    features = tuple(features)
+    if not 1 <= len(features) <= MAX_SWEEP_FEATURES:
+        raise ValueError(f"Sweep 1 to {MAX_SWEEP_FEATURES} features, got {len(features)}")
+    if len(set(features)) != len(features):
+        raise ValueError("Swept features must be distinct")
+
+    base = predictor.as_features(predictor._record_features(profile))[0]
+    axes = tuple(
+        np.asarray(values[i], dtype=np.float64) if values is not None else sweep_values(name)
+        for i, name in enumerate(features)
+    )
+    columns = [predictor.feature_names.index(name) for name in features]
+
+    with metrics.timed('whatif.sweep'):
+        # Interpolated lookup tables do not follow tree bins; score every value
+        if predictor.lookup_table is None:
+            distinct = [_distinct_values(predictor, column, axis)
+                        for column, axis in zip(columns, axes)]
+        else:
+            distinct = [(np.arange(len(axis)), np.arange(len(axis))) for axis in axes]
+
+        # One row per grid point: the profile repeated, swept columns overwritten
+        grid = np.meshgrid(*(axis[representatives] for axis, (representatives, _)
+                             in zip(axes, distinct)), indexing='ij')
+        X = np.tile(base, (grid[0].size, 1))
+        for column, values_at in zip(columns, grid):
+            X[:, column] = values_at.ravel()
+        scored = predictor.predict_batch(X).risk_prob.reshape(grid[0].shape)
+        risk_prob = scored[np.ix_(*(inverse for _, inverse in distinct))]
+    return Sweep(features=features, axes=axes, risk_prob=risk_prob,
+                 current=tuple(float(base[column]) for column in columns),
+                 rows_scored=len(X))
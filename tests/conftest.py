@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from heart_risk.engine import BACKENDS, HeartRiskPredictor  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def model_dir():
+    """Directory holding the repository's model files."""
+    return REPO_ROOT
+
+
+@pytest.fixture(scope='session', params=BACKENDS)
+def predictor(request, model_dir):
+    """The repository's model, once per backend, without cache or monitor."""
+    return HeartRiskPredictor.from_directory(model_dir, backend=request.param,
+                                             cache=False, monitor=False)
@@ -0,0 +1,101 @@
+import logging
+import os
+import warnings
+
+import numpy as np
+import pytest
+
+from heart_risk import engine
+from heart_risk.engine import (MODEL_FILES, HeartRiskPredictor, ModelFilesNotFoundError,
+                               reference_inputs)
+from heart_risk.reload import PARITY_TOLERANCE
+
+
+def test_labels_match_model_predict(predictor):
+    assert predictor.verify_label_parity() == 0
+
+
+def test_single_and_batch_predictions_agree(predictor):
+    X = reference_inputs(64, seed=7)
+    batch = predictor.predict_batch(X)
+    for row, label, probability in zip(X, batch.labels, batch.probabilities):
+        prediction = predictor.predict_one(row)
+        assert prediction.label == label
+        assert prediction.probability == probability
+
+
+def test_array_input_does_not_warn(predictor):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        predictor.predict_batch(reference_inputs(16))
+        predictor.model.predict_proba(reference_inputs(16))
+
+
+def test_no_process_wide_warning_filter(predictor):
+    assert not any(pattern is not None and 'feature names' in pattern.pattern
+                   for _, pattern, *_ in warnings.filters)
+
+
+def test_loaded_model_matches_pickle(predictor):
+    import joblib
+    import pandas as pd
+
+    model = joblib.load(os.path.join(predictor.source_dir, MODEL_FILES['model']))
+    assert list(model.feature_names_in_) == predictor.feature_names
+    X = reference_inputs(256)
+    expected = model.predict_proba(pd.DataFrame(X, columns=predictor.feature_names))
+    np.testing.assert_array_equal(predictor.model.predict_proba(X), expected)
+
+
+def test_backend_probabilities_match_predict_proba(predictor):
+    assert predictor.max_proba_deviation() <= PARITY_TOLERANCE
+
+
+def test_flat_forest_matches_sklearn_on_split_thresholds(predictor):
+    from heart_risk.flat_forest import FlatForest
+
+    forest = FlatForest.from_sklearn(predictor.model)
+    # Rows sitting exactly on (and just around) split thresholds exercise
+    # the float32 comparison sklearn uses
+    X = np.tile(reference_inputs(1)[0], (300, 1))
+    rng = np.random.default_rng(0)
+    splits = np.flatnonzero(forest.children_left != np.arange(forest.node_count))
+    for row, node in zip(X, rng.choice(splits, len(X))):
+        row[forest.feature[node]] = forest.threshold[node] + rng.choice([-1e-7, 0, 1e-7])
+    np.testing.assert_allclose(forest.predict_proba(X), predictor.model.predict_proba(X),
+                               rtol=0, atol=PARITY_TOLERANCE)
+
+
+@pytest.fixture
+def broken_bundle(tmp_path, model_dir):
+    from heart_risk.bundle import BUNDLE_DIRNAME, FOREST_DIRNAME, build_bundle
+
+    bundle_dir = str(tmp_path / BUNDLE_DIRNAME)
+    build_bundle(HeartRiskPredictor.from_directory(model_dir, cache=False, monitor=False),
+                 bundle_dir)
+    with open(os.path.join(bundle_dir, FOREST_DIRNAME, 'value.npy'), 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'\xff')
+    return bundle_dir
+
+
+def test_configured_bundle_errors_are_raised(broken_bundle, model_dir, monkeypatch):
+    from heart_risk.bundle import BundleIntegrityError
+
+    monkeypatch.setattr(engine, 'BUNDLE_PATH', broken_bundle)
+    with pytest.raises(BundleIntegrityError):
+        HeartRiskPredictor.load(search_dirs=(model_dir,), cache=False, monitor=False)
+
+    monkeypatch.setattr(engine, 'BUNDLE_PATH', os.path.join(broken_bundle, 'missing'))
+    with pytest.raises(ModelFilesNotFoundError):
+        HeartRiskPredictor.load(search_dirs=(model_dir,), cache=False, monitor=False)
+
+
+def test_discovered_bundle_errors_fall_back(broken_bundle, model_dir, monkeypatch, caplog):
+    monkeypatch.setattr(engine, 'BUNDLE_PATH', None)
+    search_dirs = (os.path.dirname(broken_bundle), model_dir)
+    with caplog.at_level(logging.WARNING, logger='heart_risk.engine'):
+        predictor = HeartRiskPredictor.load(search_dirs=search_dirs, cache=False,
+                                            monitor=False)
+    assert predictor.source_dir != broken_bundle
+    assert broken_bundle in caplog.text
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from heart_risk.engine import HeartRiskPredictor, reference_inputs
+from heart_risk.export import PARITY_TOLERANCE, check_parity, export_portable
+from heart_risk.portable import PortableModel
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory, model_dir):
+    predictor = HeartRiskPredictor.from_directory(model_dir, backend='sklearn',
+                                                  cache=False, monitor=False)
+    path = str(tmp_path_factory.mktemp('export') / 'model.npz')
+    metadata = export_portable(predictor, path)
+    return predictor, PortableModel.load(path), metadata
+
+
+def test_export_matches_sklearn_on_reference_inputs(exported):
+    predictor, portable, metadata = exported
+    max_deviation, mismatches = check_parity(portable, predictor.model)
+    assert max_deviation <= PARITY_TOLERANCE
+    assert mismatches == 0
+    assert metadata['parity']['label_mismatches'] == 0
+    assert metadata['parity']['max_abs_dp'] <= PARITY_TOLERANCE
+
+
+def test_export_matches_sklearn_on_unseen_inputs(exported):
+    predictor, portable, _ = exported
+    max_deviation, mismatches = check_parity(portable, predictor.model,
+                                             reference_inputs(2000, seed=1234))
+    assert max_deviation <= PARITY_TOLERANCE
+    assert mismatches == 0
+
+
+def test_export_keeps_model_identity(exported):
+    predictor, portable, _ = exported
+    assert portable.model_hash == predictor.model_hash
+    assert portable.feature_names == predictor.feature_names
+    np.testing.assert_array_equal(portable.classes_, predictor.classes_)
+
+
+def test_records_by_name_match_rows(exported):
+    predictor, portable, _ = exported
+    X = reference_inputs(8, seed=5)
+    records = [dict(zip(predictor.feature_names, row.tolist())) for row in X]
+    np.testing.assert_array_equal(portable.predict_proba(records), portable.predict_proba(X))
+
+
+def test_check_parity_detects_a_changed_model(exported):
+    predictor, portable, metadata = exported
+    value = portable.value.copy()
+    value[portable.roots[0]:portable.roots[1]] = 1 - value[portable.roots[0]:portable.roots[1]]
+    broken = PortableModel(portable.feature, portable.threshold, portable.left, portable.right,
+                           value, portable.roots, metadata)
+    max_deviation, _ = check_parity(broken, predictor.model)
+    assert max_deviation > PARITY_TOLERANCE
@@ -0,0 +1,76 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from heart_risk.engine import reference_inputs, risk_levels_for
+from heart_risk.lookup import DECISION_BOUNDARIES, DTYPES, TIER_MARGIN, build_table
+from heart_risk.reload import smoke_test
+
+# Two points per continuous axis: every off-grid row interpolates across
+# the whole widget range, the worst case for interpolation
+COARSE_STEPS = {'age': 80, 'trestbps': 120, 'chol': 300, 'thalach': 160, 'oldpeak': 6.0}
+
+
+def _forest(model_dir):
+    from heart_risk.engine import HeartRiskPredictor
+
+    return HeartRiskPredictor.from_directory(model_dir, backend='flat', cache=False,
+                                             lookup_table=False, monitor=False)
+
+
+def _grid_rows(risk_table):
+    return np.array(list(itertools.product(*(axis.tolist() for axis in risk_table.axes))))
+
+
+@pytest.fixture(scope='module')
+def table(tmp_path_factory, model_dir):
+    predictor = _forest(model_dir)
+    path = str(tmp_path_factory.mktemp('lookup') / 'risk_table')
+    return predictor, build_table(predictor, path, steps=COARSE_STEPS)
+
+
+@pytest.mark.parametrize('dtype', DTYPES)
+def test_grid_points_match_the_forest(tmp_path, model_dir, dtype):
+    from heart_risk.engine import HeartRiskPredictor
+
+    forest = _forest(model_dir)
+    risk_table = build_table(forest, str(tmp_path / 'risk_table'), steps=COARSE_STEPS,
+                             dtype=dtype)
+    served = HeartRiskPredictor(forest.model, forest.feature_names, forest.model_info,
+                                backend='flat', model_hash=forest.model_hash,
+                                forest=forest.forest, lookup_table=risk_table,
+                                cache=False, monitor=False)
+    X = _grid_rows(risk_table)
+    expected = forest.predict_batch(X)
+    actual = served.predict_batch(X)
+
+    # Rows sitting exactly on every decision boundary are covered
+    for boundary in DECISION_BOUNDARIES:
+        assert np.any(expected.probabilities == boundary)
+    np.testing.assert_array_equal(actual.labels, expected.labels)
+    np.testing.assert_array_equal(actual.risk_levels, expected.risk_levels)
+    assert np.abs(actual.probabilities - expected.probabilities).max() <= risk_table.max_error
+    if dtype == 'uint8':
+        assert risk_table.max_error == 0
+    assert served.verify_label_parity(X) == 0
+    smoke_test(served, forest)
+
+
+def test_interpolation_never_changes_the_risk_tier(table):
+    predictor, risk_table = table
+    X = reference_inputs(5000, seed=11)
+    expected = predictor.predict_proba(X)[:, 1]
+    served = risk_table.predict_proba(X, predictor.predict_proba, interpolate=True)[:, 1]
+    np.testing.assert_array_equal(risk_levels_for(served * 100), risk_levels_for(expected * 100))
+
+
+def test_untrusted_cells_fall_back_to_the_forest(table):
+    predictor, risk_table = table
+    X = reference_inputs(5000, seed=12)
+    probabilities, found = risk_table.lookup(X, interpolate=True)
+    assert not found.all()
+    assert np.isnan(probabilities[~found]).all()
+    trusted = probabilities[found]
+    distance = np.min([np.abs(trusted - boundary) for boundary in DECISION_BOUNDARIES], axis=0)
+    assert np.all(distance >= TIER_MARGIN)
@@ -0,0 +1,179 @@
+import pandas as pd
+import pytest
+
+from heart_risk import Prediction, shared_cache
+from heart_risk.cache import PredictionCache
+from heart_risk.engine import HeartRiskPredictor, reference_inputs
+from heart_risk.shared_cache import SqliteResultCache, TieredCache, warm
+
+LOW = Prediction(label=0, probability=0.1, risk_level='low')
+HIGH = Prediction(label=1, probability=0.9, risk_level='high')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls the time the cache stamps and expires entries with."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'results.db')
+
+
+def test_round_trip_across_instances(path):
+    writer = SqliteResultCache(path)
+    writer.bind('model-a')
+    writer.put((1.0, 2.0), HIGH)
+
+    reader = SqliteResultCache(path)
+    reader.bind('model-a')
+    assert reader.get((1.0, 2.0)) == HIGH
+    assert reader.get((2.0, 1.0)) is None
+    assert (reader.hits, reader.misses) == (1, 1)
+
+
+def test_entries_are_isolated_by_model_hash(path):
+    cache = SqliteResultCache(path)
+    cache.bind('model-a')
+    cache.put((1.0,), HIGH)
+
+    cache.bind('model-b')
+    assert cache.get((1.0,)) is None
+    cache.put((1.0,), LOW)
+    assert cache.get((1.0,)) == LOW
+
+    # Binding never drops another model's entries
+    cache.bind('model-a')
+    assert cache.get((1.0,)) == HIGH
+    assert len(cache) == 2
+
+
+def test_clear_only_drops_the_bound_model(path):
+    cache = SqliteResultCache(path)
+    cache.bind('model-a')
+    cache.put((1.0,), HIGH)
+    cache.bind('model-b')
+    cache.put((1.0,), LOW)
+    cache.clear()
+    assert cache.get((1.0,)) is None
+    cache.bind('model-a')
+    assert cache.get((1.0,)) == HIGH
+
+
+def test_entries_expire_after_ttl(path, clock):
+    cache = SqliteResultCache(path, ttl=60)
+    cache.bind('model-a')
+    cache.put((1.0,), HIGH)
+
+    clock[0] += 59
+    assert cache.get((1.0,)) == HIGH
+    clock[0] += 2
+    assert cache.get((1.0,)) is None
+    assert cache.prune() == 1
+    assert len(cache) == 0
+
+
+def test_prune_evicts_oldest_above_max_entries(path, clock):
+    cache = SqliteResultCache(path, max_entries=3)
+    cache.bind('model-a')
+    for value in range(5):
+        clock[0] += 1
+        cache.put((float(value),), HIGH)
+
+    assert cache.prune() == 2
+    assert len(cache) == 3
+    assert cache.get((0.0,)) is None
+    assert cache.get((1.0,)) is None
+    assert all(cache.get((float(value),)) == HIGH for value in (2, 3, 4))
+
+
+def test_put_prunes_every_prune_every_writes(path, clock, monkeypatch):
+    monkeypatch.setattr(shared_cache, 'PRUNE_EVERY', 4)
+    cache = SqliteResultCache(path, max_entries=2)
+    cache.bind('model-a')
+    for value in range(4):
+        clock[0] += 1
+        cache.put((float(value),), HIGH)
+    assert len(cache) == 2
+
+
+def test_broken_database_is_a_miss(tmp_path):
+    cache = SqliteResultCache(str(tmp_path / 'results.db'))
+    cache.bind('model-a')
+    cache._connection().execute('DROP TABLE results')
+    assert cache.get((1.0,)) is None
+    cache.put((1.0,), HIGH)
+    assert cache.errors == 2
+
+
+def test_unusable_path_disables_the_cache(tmp_path, predictor):
+    cache = SqliteResultCache(str(tmp_path / 'missing' / 'results.db'))
+    assert cache.disabled
+    cache.bind(predictor.model_hash)
+    cache.put((1.0,), HIGH)
+    assert cache.get((1.0,)) is None
+    assert len(cache) == 0
+
+    cached = HeartRiskPredictor(predictor.model, predictor.feature_names, predictor.model_info,
+                                backend=predictor.backend, model_hash=predictor.model_hash,
+                                forest=predictor.forest, cache=cache, monitor=False)
+    row = reference_inputs(1)[0]
+    assert cached.predict_one(row) == predictor.predict_one(row)
+
+
+def test_tiered_cache_fills_local_from_shared(path):
+    shared = SqliteResultCache(path)
+    shared.bind('model-a')
+    shared.put((1.0,), HIGH)
+
+    tiered = TieredCache(PredictionCache(16), SqliteResultCache(path))
+    tiered.bind('model-a')
+    assert len(tiered.local) == 0
+    assert tiered.get((1.0,)) == HIGH
+    assert tiered.local.get((1.0,)) == HIGH
+    assert tiered.shared.hits == 1
+
+    # Served from the local LRU from now on
+    assert tiered.get((1.0,)) == HIGH
+    assert tiered.shared.hits == 1
+
+
+def test_tiered_cache_writes_through(path):
+    tiered = TieredCache(PredictionCache(16), SqliteResultCache(path))
+    tiered.bind('model-a')
+    tiered.put((2.0,), LOW)
+
+    other = SqliteResultCache(path)
+    other.bind('model-a')
+    assert other.get((2.0,)) == LOW
+
+
+def test_empty_copy_shares_the_file_not_the_binding(path):
+    cache = TieredCache(PredictionCache(16), SqliteResultCache(path))
+    cache.bind('model-a')
+    cache.put((1.0,), HIGH)
+
+    copy = cache.empty_copy()
+    assert copy.model_hash is None
+    assert len(copy.local) == 0
+    copy.bind('model-a')
+    assert copy.get((1.0,)) == HIGH
+    assert cache.model_hash == 'model-a'
+
+
+def test_warm_serves_predictor_from_shared_cache(path, predictor):
+    X = reference_inputs(50, seed=3)
+    frame = pd.DataFrame(X, columns=predictor.feature_names)
+    assert warm(SqliteResultCache(path), predictor, frame) == len(X)
+
+    cache = SqliteResultCache(path)
+    cached = HeartRiskPredictor(predictor.model, predictor.feature_names, predictor.model_info,
+                                backend=predictor.backend, model_hash=predictor.model_hash,
+                                forest=predictor.forest, cache=cache, monitor=False)
+    for row in X:
+        assert cached.predict_one(row) == predictor.predict_one(row)
+    assert cache.misses == 0
+    assert cache.hits == len(X)